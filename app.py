@@ -3,16 +3,56 @@ FastAPI application for BERT text classification model.
 This API provides a single endpoint for text classification using a pre-trained BERT model.
 """
 
+import asyncio
+import gc
+import hmac
 import os
 import logging
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any
+from typing import Awaitable, Dict, Any, List, Literal, NamedTuple, Optional, Tuple
 
-import torch
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, Field, ValidationError, model_validator
+
+from batching import MicroBatcher, QueueFullError, parse_lanes
+from cache import create_prediction_cache
+from executor import InferenceExecutor
+from pipeline import InferencePipeline
+from lazy_imports import lazy_import, load_deferred
+from metrics import (
+    LANE_LATENCY, LANE_QUEUE_DEPTH, QUEUE_DEPTH, REQUESTS_SHED, MetricsMiddleware, observe_inference,
+    render as render_metrics,
+)
+from prediction_store import create_prediction_store
+from profiling import Profiler
+from procinfo import memory_usage
+from timing import RequestTiming, enable_timing_log
+from streaming import LineTooLongError, NDJSONStreamingResponse, iter_lines, ndjson_line
+from inference import (
+    AGGREGATIONS,
+    ThreadLocalTokenizer,
+    aggregate_logits,
+    bucket_length,
+    encode_texts,
+    encode_windows,
+    estimate_tokens,
+    forward_logits,
+    lookup_logits,
+    pad_encodings,
+    parse_length_buckets,
+    record_forward,
+    remember_logits,
+    warm_up,
+)
+
+# torch and transformers are only imported once the model loads, so the
+# server binds its port without waiting for them
+torch = lazy_import("torch")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -36,10 +76,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record request latency, status codes and in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Global variables for model and tokenizer
 model = None
 tokenizer = None
 device = None
+batcher = None
+inference_executor = None
+prediction_pipeline = None
+prediction_cache = None
+prediction_store = None
+model_load_error = None
+model_ready = False
+startup_phases: Dict[str, float] = {}
+warmup_shapes: List[Dict[str, Any]] = []
+startup_task = None
+
+# Model configuration
+MODEL_PATH = "."  # Current directory where model files are located
+MAX_LENGTH = 512  # Maximum sequence length for BERT
+BACKEND = os.getenv("FITMIND_BACKEND", "fp32")  # Inference backend: fp32, int8 or onnx
+LENGTH_BUCKETS = parse_length_buckets(os.getenv("FITMIND_LENGTH_BUCKETS"))  # Padded lengths; "none" pads to longest
+
+# Batching configuration
+MAX_BATCH_SIZE = int(os.getenv("FITMIND_MAX_BATCH_SIZE", 16))  # Max requests per forward pass
+MAX_BATCH_TOKENS = int(os.getenv("FITMIND_MAX_BATCH_TOKENS", 2048)) or None  # Max padded tokens per batch (0 = none)
+MAX_DEFER_MS = float(os.getenv("FITMIND_MAX_DEFER_MS", 100))  # Longest a long request is held back for shorter ones
+MAX_WAIT_MS = float(os.getenv("FITMIND_MAX_WAIT_MS", 5))  # Max time to wait for a batch to fill
+MAX_BATCH_ITEMS = int(os.getenv("FITMIND_MAX_BATCH_ITEMS", 256))  # Max texts per /predict/batch request
+
+# Admission control: reject quickly under overload instead of letting every request time out.
+# The depth must hold what one bulk request queues at once (checked below), or the bulk endpoints always get 429
+MAX_QUEUE_DEPTH = int(os.getenv("FITMIND_MAX_QUEUE_DEPTH", 256)) or None  # Queued requests before 429s (0 = unbounded)
+QUEUE_RETRY_AFTER_SECONDS = int(os.getenv("FITMIND_QUEUE_RETRY_AFTER", 1))  # Retry-After sent with 429s
+
+# Priority lanes: bulk backfills share the batching queue with live mood checks without starving them
+LANES = parse_lanes(os.getenv("FITMIND_LANES", "interactive:8,bulk:1"))  # Lane weights; the first lane is the default
+LANE_LIMITS = parse_lanes(
+    os.getenv("FITMIND_LANE_LIMITS", "bulk:64" if "bulk" in LANES else ""), int
+)  # Requests of a lane queued or running at once
+LANE_KEYS = parse_lanes(os.getenv("FITMIND_LANE_KEYS"), str)  # API keys (X-API-Key) pinned to a lane
+# /predict/batch and /predict/stream score in this lane unless the request names another
+BULK_LANE = "bulk" if "bulk" in LANES else next(iter(LANES))
+if set(LANE_KEYS.values()) - set(LANES):
+    unknown_lanes = sorted(set(LANE_KEYS.values()) - set(LANES))
+    raise ValueError(f"FITMIND_LANE_KEYS names unknown lanes: {', '.join(unknown_lanes)}")
+
+# Streaming configuration
+STREAM_BATCH_SIZE = int(os.getenv("FITMIND_STREAM_BATCH_SIZE", 32))  # Lines scored together by /predict/stream
+MAX_STREAM_LINE_BYTES = int(os.getenv("FITMIND_MAX_STREAM_LINE_BYTES", 65536))  # Longest accepted NDJSON line
+
+# Long-document configuration
+MAX_LONG_TEXT_CHARS = int(os.getenv("FITMIND_MAX_LONG_TEXT_CHARS", 100000))  # Max characters for /predict/long
+MAX_WINDOWS_PER_PASS = int(os.getenv("FITMIND_MAX_WINDOWS_PER_PASS", 32))  # Windows of a /predict/long queued at once
+
+# /predict/batch, /predict/stream and /predict/long queue many items at once, up to their lane's limit;
+# batches and streams never rank above the bulk lane
+BULK_FAN_OUT = max(
+    [min(size, LANE_LIMITS.get(lane, size))
+     for lane in list(LANES)[list(LANES).index(BULK_LANE):]
+     for size in (MAX_BATCH_ITEMS, STREAM_BATCH_SIZE)]
+    + [min(MAX_WINDOWS_PER_PASS, LANE_LIMITS.get(lane, MAX_WINDOWS_PER_PASS)) for lane in LANES]
+)
+if MAX_QUEUE_DEPTH is not None and MAX_QUEUE_DEPTH < BULK_FAN_OUT:
+    raise ValueError(
+        f"FITMIND_MAX_QUEUE_DEPTH ({MAX_QUEUE_DEPTH}) is below the {BULK_FAN_OUT} items one bulk request "
+        f"may queue at once; raise it, or lower FITMIND_LANE_LIMITS or the per-request sizes"
+    )
+
+# Threading configuration
+INFERENCE_WORKERS = int(os.getenv("FITMIND_INFERENCE_WORKERS", 1))  # Threads running blocking inference
+# Tokenize and format /predict batches on their own threads; with a single core there is nothing to overlap
+PIPELINE = os.getenv("FITMIND_PIPELINE", "1" if (os.cpu_count() or 1) > 1 else "0") == "1"
+TORCH_THREADS = int(os.getenv("FITMIND_TORCH_THREADS", 0))  # Intra-op threads per forward pass (0 = torch default)
+TORCH_INTEROP_THREADS = int(os.getenv("FITMIND_TORCH_INTEROP_THREADS", 0))  # Inter-op threads (0 = torch default)
+
+# Load the model at import time so pre-forked workers share it (opt-in via gunicorn.conf.py)
+PRELOAD_MODEL = os.getenv("FITMIND_PRELOAD_MODEL", "0") == "1"
+RETRY_AFTER_SECONDS = int(os.getenv("FITMIND_RETRY_AFTER", 5))  # Retry-After sent with 503s while the model loads
+
+# Warmup configuration: forward passes at every served shape before reporting ready
+WARMUP = os.getenv("FITMIND_WARMUP", "1") == "1"
+WARMUP_BATCH_SIZES = sorted({
+    int(size) for size in os.getenv("FITMIND_WARMUP_BATCH_SIZES", f"1,{MAX_BATCH_SIZE}").split(",") if size.strip()
+})  # Batch sizes warmed at each length bucket, capped by FITMIND_MAX_BATCH_TOKENS
+WARMUP_ROUNDS = int(os.getenv("FITMIND_WARMUP_ROUNDS", 1))  # Passes per shape
+
+# Observability configuration
+TIMING_LOG = os.getenv("FITMIND_TIMING_LOG", "0") == "1"  # Log one JSON line of stage timings per /predict request
+
+if TIMING_LOG:
+    enable_timing_log()
+
+# Admin configuration
+ADMIN_TOKEN = os.getenv("FITMIND_ADMIN_TOKEN")  # Required in X-Admin-Token for /admin endpoints; unset disables them
+PROFILE_DIR = os.getenv("FITMIND_PROFILE_DIR", "profiles")  # Where profile captures are written
+MAX_PROFILE_SECONDS = 600  # Longest capture accepted by /admin/profile
+
+# Captures are started by /admin/profile; inference only checks whether one is running
+profiler = Profiler(PROFILE_DIR)
 
 # Request/Response models
 class TextInput(BaseModel):
@@ -50,20 +187,97 @@ class PredictionResponse(BaseModel):
     confidence: float
     probabilities: Dict[str, float]
 
-# Model configuration
-MODEL_PATH = "."  # Current directory where model files are located
-MAX_LENGTH = 512  # Maximum sequence length for BERT
+class LongTextInput(BaseModel):
+    text: str = Field(..., description="Text to classify", min_length=1, max_length=MAX_LONG_TEXT_CHARS)
+    window_size: int = Field(512, description="Tokens per window, including [CLS] and [SEP]", ge=16, le=MAX_LENGTH)
+    stride: int = Field(128, description="Tokens shared by consecutive windows", ge=0)
+    aggregation: Literal[AGGREGATIONS] = Field(
+        "mean", description="How window logits are combined: mean, max or weighted (by tokens covered)"
+    )
+    
+    @model_validator(mode="after")
+    def check_stride(self):
+        # Each window must advance by at least one token past its two special tokens
+        if self.stride > self.window_size - 3:
+            raise ValueError("stride must be smaller than window_size - 2")
+        return self
+
+class WindowScore(PredictionResponse):
+    index: int
+    token_start: int
+    token_end: int
+
+class LongPredictionResponse(PredictionResponse):
+    aggregation: str
+    num_windows: int
+    num_tokens: int
+    windows: List[WindowScore]
+
+class BatchItem(BaseModel):
+    id: Optional[str] = Field(None, description="Caller-supplied identifier echoed back in the result")
+    text: str = Field(..., description="Text to classify", min_length=1, max_length=512)
+
+class BatchTextInput(BaseModel):
+    items: List[BatchItem] = Field(..., description="Texts to classify", min_length=1)
+
+class BatchPredictionItem(PredictionResponse):
+    id: Optional[str] = None
+
+class ProfileRequest(BaseModel):
+    requests: int = Field(50, description="Number of texts to profile", ge=1, le=10000)
+    seconds: float = Field(30, description="Maximum capture duration in seconds", gt=0, le=MAX_PROFILE_SECONDS)
+
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionItem]
+
+
+def configure_torch_threads():
+    """Apply the configured torch intra-op and inter-op thread counts."""
+    if TORCH_THREADS > 0:
+        torch.set_num_threads(TORCH_THREADS)
+    if TORCH_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op parallel work has started
+            logger.warning(f"Could not set inter-op threads: {str(e)}")
+    logger.info(
+        f"Torch threads: intra-op={torch.get_num_threads()}, "
+        f"inter-op={torch.get_num_interop_threads()}"
+    )
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Time one phase of startup, for the logs and /health."""
+    started = time.perf_counter()
+    yield
+    startup_phases[name] = round(time.perf_counter() - started, 3)
+    logger.info(f"Startup phase '{name}' took {startup_phases[name]:.2f}s")
 
 
 def load_model_and_tokenizer():
-    """Load the BERT model and tokenizer from local files."""
-    global model, tokenizer, device
+    """
+    Load the BERT model and tokenizer from local files.
+    
+    The globals are only assigned once everything has loaded, so a server
+    loading in the background never serves a half-initialized model.
+    """
+    global model, tokenizer, device, prediction_cache, prediction_store
     
     try:
+        # Import the ML libraries (deferred at startup, see lazy_imports.py)
+        with startup_phase("imports"):
+            load_deferred("torch", "transformers")
+            from backends import load_model, load_tokenizer
+        
         # Set device
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Using device: {device}")
         
+        # Configure torch thread pools before any parallel work runs
+        configure_torch_threads()
+        
         # Check if model files exist
         required_files = [
             "config.json",
@@ -79,14 +293,27 @@ def load_model_and_tokenizer():
         
         # Load tokenizer
         logger.info("Loading tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+        with startup_phase("tokenizer"):
+            loaded_tokenizer = load_tokenizer(MODEL_PATH)
+        
+        # Load model (evaluation mode, quantized for int8, an ORT session for onnx);
+        # safetensors weights are memory-mapped rather than read into fresh memory
+        logger.info(f"Loading model with {BACKEND} backend...")
+        with startup_phase("model"):
+            loaded_model = load_model(MODEL_PATH, device, BACKEND, num_threads=TORCH_THREADS)
+        
+        # Cache logits of repeated texts (disabled with FITMIND_CACHE_SIZE=0);
+        # the model fingerprint hashes the weights
+        with startup_phase("cache"):
+            prediction_cache = create_prediction_cache(MODEL_PATH, loaded_tokenizer, BACKEND, MAX_LENGTH)
         
-        # Load model
-        logger.info("Loading model...")
-        model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
-        model.to(device)
-        model.eval()  # Set to evaluation mode
+        # Persist logits across restarts (enabled with FITMIND_STORE_PATH)
+        with startup_phase("store"):
+            prediction_store = create_prediction_store(MODEL_PATH, loaded_tokenizer, BACKEND, MAX_LENGTH)
         
+        # The pipeline's stages and /predict/long tokenize on different
+        # threads, each with its own copy of the tokenizer
+        tokenizer, model = ThreadLocalTokenizer(loaded_tokenizer), loaded_model
         logger.info("Model and tokenizer loaded successfully!")
         
     except Exception as e:
@@ -94,6 +321,253 @@ def load_model_and_tokenizer():
         raise RuntimeError(f"Failed to load model: {str(e)}")
 
 
+def preload_model():
+    """
+    Load the model in the current (master) process before workers are forked.
+    
+    Forked workers then share the weight pages copy-on-write. The model is
+    only loaded here, never run: running a forward pass before forking would
+    start torch's thread pools, which do not survive a fork.
+    """
+    load_model_and_tokenizer()
+    
+    # Move everything loaded so far out of the garbage collector's reach, so
+    # collections in the workers do not write to (and thereby copy) its pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Model preloaded for forked workers: {memory_usage()}")
+
+
+def warm_up_model():
+    """Run the configured warmup shapes through the model."""
+    global warmup_shapes
+    
+    with startup_phase("warmup"):
+        warmup_shapes = warm_up(
+            model, tokenizer, device,
+            batch_sizes=WARMUP_BATCH_SIZES,
+            max_length=MAX_LENGTH,
+            buckets=LENGTH_BUCKETS,
+            rounds=WARMUP_ROUNDS,
+            max_batch_tokens=MAX_BATCH_TOKENS
+        )
+    logger.info(f"Warmed up {len(warmup_shapes)} shapes: {warmup_shapes}")
+
+
+async def prepare_model():
+    """
+    Load the model in the background (unless preloaded), warm it up, then mark the server ready.
+    
+    Loading runs on a plain worker thread; the warmup runs on the inference
+    threads themselves, whose thread-local state it also warms.
+    """
+    global model_load_error, model_ready
+    
+    started = time.perf_counter()
+    if model is None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, load_model_and_tokenizer)
+        except RuntimeError as e:
+            # Keep serving liveness and readiness probes so the failure is visible
+            model_load_error = str(e)
+            return
+    
+    # Threads do not survive a fork, so compaction starts in each worker
+    if prediction_store is not None:
+        prediction_store.start_compaction()
+    
+    if WARMUP:
+        try:
+            await inference_executor.run(warm_up_model)
+        except Exception as e:
+            # A failed warmup only costs latency; the model itself loaded fine
+            logger.warning(f"Warmup failed: {str(e)}")
+    
+    model_ready = True
+    startup_phases["ready"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Model ready {startup_phases['ready']:.2f}s after startup; worker memory: {memory_usage()}")
+
+
+def is_ready() -> bool:
+    """Whether predictions can be served: model loaded and warmed up, and batcher running."""
+    return model_ready and batcher is not None and batcher.running
+
+
+def require_ready():
+    """Fail fast with 503 and Retry-After until the model is ready."""
+    if is_ready():
+        return
+    if model_load_error is not None:
+        raise HTTPException(status_code=503, detail=f"Model failed to load: {model_load_error}")
+    raise HTTPException(
+        status_code=503,
+        detail="Model is loading. Please retry shortly.",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+
+def request_lane(
+    priority: Optional[str], api_key: Optional[str], default: Optional[str] = None, highest: Optional[str] = None
+) -> str:
+    """
+    Pick the priority lane of a request.
+    
+    An API key listed in FITMIND_LANE_KEYS decides the lane, so a bulk client
+    cannot promote itself; otherwise the X-Priority header does, and without
+    either the request goes to ``default`` (by default the first lane).
+    With ``highest``, the request never ranks above that lane: a key pinned
+    to a higher lane is held to it, and an X-Priority naming one gets 422.
+    """
+    lanes = list(LANES)
+    ceiling = lanes.index(highest) if highest is not None else 0
+    if api_key is not None and api_key in LANE_KEYS:
+        return lanes[max(lanes.index(LANE_KEYS[api_key]), ceiling)]
+    if priority is None:
+        return default or lanes[0]
+    if priority not in LANES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown priority {priority!r}; expected one of: {', '.join(LANES)}"
+        )
+    if lanes.index(priority) < ceiling:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Priority {priority!r} is not allowed here; expected one of: {', '.join(lanes[ceiling:])}"
+        )
+    return priority
+
+
+def export_queue_depth(depth: int):
+    """Export the batching queue depth, in total and per lane."""
+    QUEUE_DEPTH.set(depth)
+    for lane, queued in batcher.lane_depths().items():
+        LANE_QUEUE_DEPTH.labels(lane).set(queued)
+
+
+async def gather_submissions(
+    submissions: List[Awaitable], request: Optional[Request] = None, deadline: Optional[float] = None
+) -> List[Any]:
+    """
+    Wait for several batcher submissions of one request, cancelling them all if one fails.
+    
+    On the first failure, at the deadline, when the client disconnects or
+    when the caller is cancelled, the other submissions are cancelled, so
+    their items that are still queued are never run.
+    
+    Args:
+        submissions: Awaitables of batcher.submit
+        request: Incoming request, watched for a client disconnect, or None
+        deadline: time.perf_counter() value after which the results are useless, or None
+        
+    Returns:
+        The results of the submissions, in order
+        
+    Raises:
+        QueueFullError: The batching queue is full
+        asyncio.TimeoutError: The deadline passed first
+        ClientDisconnect: The client disconnected first
+    """
+    tasks = [asyncio.ensure_future(submission) for submission in submissions]
+    results = asyncio.gather(*tasks)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(request)) if request is not None else None
+    try:
+        timeout = None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+        waiting = {results} if disconnect is None else {results, disconnect}
+        done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if results in done:
+            return results.result()
+        if disconnect in done:
+            raise ClientDisconnect()
+        raise asyncio.TimeoutError()
+    finally:
+        if not results.done():
+            results.cancel()
+            # The cancelled gather ends with a CancelledError nobody awaits; retrieve it so it is not logged
+            results.add_done_callback(lambda future: future.cancelled() or future.exception())
+        for task in tasks:
+            task.cancel()
+        if disconnect is not None:
+            disconnect.cancel()
+
+
+async def predict_in_lane(texts: List[str], lane: str, request: Optional[Request] = None) -> List[PredictionResponse]:
+    """
+    Score many texts through the batcher, in one lane.
+    
+    The texts are queued individually, so the batcher forms their batches
+    by token budget and interleaves them with other lanes' batches. Beyond
+    the lane's limit, texts wait for room instead of being rejected. If one
+    text fails (e.g. the queue is full) or the client disconnects, the
+    others are cancelled, so those still queued are never run.
+    
+    Args:
+        texts: Texts to classify
+        lane: Priority lane to queue the texts in
+        request: Incoming request, watched for a client disconnect, or None
+        
+    Returns:
+        One PredictionResponse per text, in input order
+        
+    Raises:
+        QueueFullError: The batching queue is full
+        ClientDisconnect: The client disconnected first
+    """
+    async def submit(text: str) -> PredictionResponse:
+        timing = RequestTiming()
+        prediction = await batcher.submit((text, timing), lane, wait=True)
+        # Per text, so bulk latency compares with that of single /predict requests
+        LANE_LATENCY.labels(lane).observe(time.perf_counter() - timing.submitted)
+        return prediction
+    
+    return await gather_submissions([submit(text) for text in texts], request)
+
+
+async def wait_for_disconnect(request: Request):
+    """Return once the client has gone away (or the response has been sent)."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def submit_until(item: Any, lane: str, request: Request, deadline: Optional[float]) -> Any:
+    """
+    Submit an item to the batcher, giving up at the deadline or when the client disconnects.
+    
+    Giving up cancels the submission, so a request that is still queued is
+    dropped by the batcher without ever being tokenized or run.
+    
+    Args:
+        item: Item for the batcher
+        lane: Priority lane to queue the item in
+        request: Incoming request, watched for a client disconnect
+        deadline: time.perf_counter() value after which the result is useless, or None
+        
+    Returns:
+        The batcher's result for the item
+        
+    Raises:
+        QueueFullError: The batching queue is full
+        asyncio.TimeoutError: The deadline passed first
+        ClientDisconnect: The client disconnected first
+    """
+    submission = asyncio.ensure_future(batcher.submit(item, lane))
+    disconnect = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        timeout = None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+        done, _ = await asyncio.wait(
+            {submission, disconnect}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if submission in done:
+            return submission.result()
+        if disconnect in done:
+            raise ClientDisconnect()
+        raise asyncio.TimeoutError()
+    finally:
+        submission.cancel()
+        disconnect.cancel()
+
+
 def get_class_labels():
     """Get class labels from the model configuration."""
     if model is None:
@@ -108,10 +582,336 @@ def get_class_labels():
         return {i: f"Class_{i}" for i in range(num_labels)}
 
 
+def format_prediction(row: "torch.Tensor", class_labels) -> Dict[str, Any]:
+    """Turn one row of probabilities into the predicted class, confidence and per-class probabilities."""
+    # Get predicted class
+    predicted_class_id = torch.argmax(row, dim=-1).item()
+    confidence = row[predicted_class_id].item()
+    
+    if class_labels:
+        predicted_class = class_labels[predicted_class_id]
+        prob_dict = {
+            class_labels[i]: prob.item() 
+            for i, prob in enumerate(row)
+        }
+    else:
+        predicted_class = str(predicted_class_id)
+        prob_dict = {
+            str(i): prob.item() 
+            for i, prob in enumerate(row)
+        }
+    
+    return {
+        "predicted_class": predicted_class,
+        "confidence": confidence,
+        "probabilities": prob_dict
+    }
+
+
+def prepare_batch(texts: List[str], stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    First stage of predict_batch: look texts up in the cache and store, and tokenize the rest.
+    
+    Args:
+        texts: Texts to classify
+        stats: Dictionary filled with stage timings, shapes and cache hits
+        
+    Returns:
+        The batch's state, handed to forward_batch
+    """
+    found, missing = lookup_logits(texts, prediction_cache, prediction_store, stats)
+    
+    # Batches are padded only up to their length bucket
+    started = time.perf_counter()
+    inputs = encode_texts(tokenizer, missing, max_length=MAX_LENGTH, buckets=LENGTH_BUCKETS) if missing else None
+    
+    return {
+        "texts": texts,
+        "found": found,
+        "missing": missing,
+        "inputs": inputs,
+        "tokenize_seconds": time.perf_counter() - started,
+    }
+
+
+def forward_batch(batch: Dict[str, Any], stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Second stage of predict_batch: run the texts found in neither cache nor store through the model."""
+    batch["computed"] = {}
+    with profiler.profile(len(batch["texts"])):
+        if batch["missing"]:
+            started = time.perf_counter()
+            logits = forward_logits(model, batch["inputs"], device)
+            record_forward(
+                stats, batch["inputs"], batch["tokenize_seconds"], time.perf_counter() - started, batch["missing"]
+            )
+            batch["computed"] = dict(zip(batch["missing"], logits))
+    return batch
+
+
+def finish_batch(batch: Dict[str, Any], stats: Dict[str, Any]) -> List[PredictionResponse]:
+    """Last stage of predict_batch: keep the new logits and build the responses."""
+    started = time.perf_counter()
+    
+    remember_logits(batch["computed"], prediction_cache, prediction_store)
+    found = {**batch["found"], **batch["computed"]}
+    
+    # Apply softmax to get probabilities
+    probabilities = torch.softmax(torch.stack([found[text] for text in batch["texts"]]), dim=-1)
+    
+    # Get class labels
+    class_labels = get_class_labels()
+    
+    predictions = [PredictionResponse(**format_prediction(row, class_labels)) for row in probabilities]
+    stats['postprocess_seconds'] = time.perf_counter() - started
+    observe_inference(stats, stats['postprocess_seconds'])
+    return predictions
+
+
+def predict_batch(texts: List[str], stats: Optional[Dict[str, Any]] = None) -> List[PredictionResponse]:
+    """
+    Run a single batched forward pass over several texts.
+    
+    Runs all three stages on the calling thread; /predict instead passes
+    its batches through them on the prediction pipeline.
+    
+    Args:
+        texts: Texts to classify
+        stats: Optional dictionary filled with stage timings, shapes and cache hits
+        
+    Returns:
+        One PredictionResponse per text, in input order
+    """
+    if stats is None:
+        stats = {}
+    return finish_batch(forward_batch(prepare_batch(texts, stats), stats), stats)
+
+
+class LongTextWindow(NamedTuple):
+    """One token window of a /predict/long text, queued in the batcher next to /predict texts."""
+    inputs: Dict[str, List[int]]
+
+
+def request_tokens(item: Any) -> int:
+    """Batching cost of a queued item: the (for a text, estimated) padded length of its tokens."""
+    if isinstance(item, LongTextWindow):
+        return min(bucket_length(len(item.inputs["input_ids"]), LENGTH_BUCKETS), MAX_LENGTH)
+    return estimate_tokens(item[0], MAX_LENGTH, LENGTH_BUCKETS)
+
+
+def is_long_text_window(item: Any) -> bool:
+    """Batching group of a queued item: windows are run apart from /predict texts."""
+    return isinstance(item, LongTextWindow)
+
+
+def forward_windows(windows: List[LongTextWindow]) -> List["torch.Tensor"]:
+    """
+    Batcher callback for a batch of /predict/long windows: pad them and run them through the model.
+    
+    Args:
+        windows: Token windows of one or more long texts
+        
+    Returns:
+        One row of logits per window, in input order
+    """
+    stats: Dict[str, Any] = {}
+    with profiler.profile(len(windows)):
+        started = time.perf_counter()
+        inputs = pad_encodings(
+            {key: [window.inputs[key] for window in windows] for key in windows[0].inputs},
+            tokenizer.pad_token_id or 0, MAX_LENGTH, LENGTH_BUCKETS
+        )
+        padded = time.perf_counter()
+        logits = forward_logits(model, inputs, device)
+        record_forward(stats, inputs, padded - started, time.perf_counter() - padded)
+    observe_inference(stats)
+    return list(logits)
+
+
+def predict_timed(items: List[Tuple[str, RequestTiming]]) -> List[PredictionResponse]:
+    """
+    Batcher callback for /predict: predict_batch plus per-request stage timings.
+    
+    Batches of /predict/long windows are passed on to forward_windows.
+    
+    Args:
+        items: (text, timing) pairs queued by /predict, or LongTextWindows
+        
+    Returns:
+        One PredictionResponse (or, for windows, row of logits) per item, in input order
+    """
+    if is_long_text_window(items[0]):
+        return forward_windows(items)
+    
+    dispatched = time.perf_counter()
+    stats: Dict[str, Any] = {}
+    predictions = predict_batch([text for text, _ in items], stats)
+    
+    for text, timing in items:
+        timing.record_batch(dispatched, stats, text, len(items))
+    return predictions
+
+
+async def predict_pipelined(items: List[Tuple[str, RequestTiming]]) -> List[PredictionResponse]:
+    """
+    Batcher callback for /predict with FITMIND_PIPELINE: predict_timed, one stage per thread.
+    
+    While this batch runs through the model, the next one is tokenized
+    and the previous one turned into responses.
+    
+    Args:
+        items: (text, timing) pairs queued by /predict, or LongTextWindows
+        
+    Returns:
+        One PredictionResponse (or, for windows, row of logits) per item, in input order
+    """
+    if is_long_text_window(items[0]):
+        # Windows come tokenized, so they skip the pipeline's prepare and finish stages
+        return await inference_executor.run(forward_windows, items)
+    
+    dispatched = time.perf_counter()
+    stats: Dict[str, Any] = {}
+    predictions = await prediction_pipeline.run([text for text, _ in items], stats)
+    
+    for text, timing in items:
+        timing.record_batch(dispatched, stats, text, len(items))
+    return predictions
+
+
+async def predict_long(
+    input_data: LongTextInput, lane: str, request: Request, deadline: Optional[float]
+) -> LongPredictionResponse:
+    """
+    Classify a long text from overlapping token windows.
+    
+    The windows are queued in the batcher like /predict texts, so they are
+    batched by token budget and take turns with the other lanes instead of
+    holding the model for the whole text. At most MAX_WINDOWS_PER_PASS of
+    them are queued at once.
+    
+    Args:
+        input_data: LongTextInput with the text and windowing options
+        lane: Priority lane to queue the windows in
+        request: Incoming request, watched for a client disconnect
+        deadline: time.perf_counter() value after which the result is useless, or None
+        
+    Returns:
+        LongPredictionResponse with the combined prediction and per-window scores
+        
+    Raises:
+        QueueFullError: The batching queue is full
+        asyncio.TimeoutError: The deadline passed first
+        ClientDisconnect: The client disconnected first
+    """
+    windows, spans = await asyncio.get_running_loop().run_in_executor(
+        None, encode_windows, tokenizer, input_data.text, input_data.window_size, input_data.stride
+    )
+    
+    rows = []
+    for start in range(0, len(windows), MAX_WINDOWS_PER_PASS):
+        rows += await gather_submissions([
+            batcher.submit(LongTextWindow(window), lane, wait=True)
+            for window in windows[start:start + MAX_WINDOWS_PER_PASS]
+        ], request, deadline)
+    
+    # Thousands of windows take a while to format; keep that off the event loop
+    return await asyncio.get_running_loop().run_in_executor(
+        None, long_prediction_response, input_data, torch.stack(rows), spans
+    )
+
+
+def long_prediction_response(
+    input_data: LongTextInput, window_logits: "torch.Tensor", spans: List[Tuple[int, int]]
+) -> LongPredictionResponse:
+    """Combine the window logits of a long text and build its response."""
+    started = time.perf_counter()
+    class_labels = get_class_labels()
+    document_logits = aggregate_logits(window_logits, spans, input_data.aggregation)
+    window_probabilities = torch.softmax(window_logits, dim=-1)
+    
+    response = LongPredictionResponse(
+        **format_prediction(torch.softmax(document_logits, dim=-1), class_labels),
+        aggregation=input_data.aggregation,
+        num_windows=len(spans),
+        num_tokens=spans[-1][1],
+        windows=[
+            WindowScore(index=i, token_start=start, token_end=end, **format_prediction(row, class_labels))
+            for i, ((start, end), row) in enumerate(zip(spans, window_probabilities))
+        ]
+    )
+    observe_inference({}, time.perf_counter() - started)
+    return response
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Load model and tokenizer on startup."""
-    load_model_and_tokenizer()
+    """
+    Start serving immediately and load the model and tokenizer in the background.
+    
+    Until the model is ready, prediction endpoints answer 503 with a
+    Retry-After header and /health/ready reports not ready.
+    """
+    global batcher, inference_executor, prediction_pipeline, startup_task
+    
+    # Blocking inference runs on dedicated threads so the event loop stays responsive
+    inference_executor = InferenceExecutor(max_workers=INFERENCE_WORKERS)
+    if PIPELINE:
+        # Forward passes stay on the inference threads; tokenization and
+        # response building for neighbouring batches overlap with them
+        prediction_pipeline = InferencePipeline([
+            ("prepare", prepare_batch, InferenceExecutor(name="prepare")),
+            ("forward", forward_batch, inference_executor),
+            ("finish", finish_batch, InferenceExecutor(name="finish")),
+        ])
+        batcher = MicroBatcher(
+            predict_pipelined,
+            max_batch_size=MAX_BATCH_SIZE,
+            max_wait_ms=MAX_WAIT_MS,
+            on_queue_change=export_queue_depth,
+            max_in_flight=prediction_pipeline.max_in_flight,
+            cost=request_tokens,
+            max_batch_tokens=MAX_BATCH_TOKENS,
+            max_defer_ms=MAX_DEFER_MS,
+            max_queue_depth=MAX_QUEUE_DEPTH,
+            lanes=LANES,
+            lane_limits=LANE_LIMITS,
+            group=is_long_text_window
+        )
+    else:
+        batcher = MicroBatcher(
+            predict_timed,
+            max_batch_size=MAX_BATCH_SIZE,
+            max_wait_ms=MAX_WAIT_MS,
+            executor=inference_executor,
+            on_queue_change=export_queue_depth,
+            cost=request_tokens,
+            max_batch_tokens=MAX_BATCH_TOKENS,
+            max_defer_ms=MAX_DEFER_MS,
+            max_queue_depth=MAX_QUEUE_DEPTH,
+            lanes=LANES,
+            lane_limits=LANE_LIMITS,
+            group=is_long_text_window
+        )
+    await batcher.start()
+    
+    if model is not None:
+        # Preloaded in the master process; thread settings are per process
+        configure_torch_threads()
+    startup_task = asyncio.create_task(prepare_model())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the batching queue and the inference threads."""
+    if batcher is not None:
+        await batcher.stop()
+    if prediction_pipeline is not None:
+        for _, _, executor in prediction_pipeline.stages:
+            if executor is not inference_executor:
+                executor.shutdown()
+    if inference_executor is not None:
+        inference_executor.shutdown()
+    if prediction_store is not None:
+        prediction_store.stop_compaction()
 
 
 @app.get("/")
@@ -129,93 +929,353 @@ async def root():
 async def health_check():
     """Health check endpoint."""
     return {
-        "status": "healthy",
+        "status": "healthy" if is_ready() else ("unhealthy" if model_load_error else "loading"),
         "model_loaded": model is not None,
         "tokenizer_loaded": tokenizer is not None,
-        "device": str(device) if device else None
+        "device": str(device) if device else None,
+        "batching": {
+            "max_batch_size": MAX_BATCH_SIZE,
+            "max_batch_tokens": MAX_BATCH_TOKENS,
+            "max_wait_ms": MAX_WAIT_MS,
+            "max_defer_ms": MAX_DEFER_MS,
+            "max_queue_depth": MAX_QUEUE_DEPTH,
+            "queue_depth": batcher.queue_depth if batcher else 0,
+            "length_buckets": LENGTH_BUCKETS,
+            "max_batch_items": MAX_BATCH_ITEMS
+        },
+        "lanes": batcher.lane_stats() if batcher else None,
+        "inference": inference_executor.stats() if inference_executor else None,
+        "pipeline": prediction_pipeline.stats() if prediction_pipeline else None,
+        "cache": prediction_cache.stats() if prediction_cache else None,
+        "store": prediction_store.stats() if prediction_store else None,
+        "memory": memory_usage(),
+        "startup": {"phases_seconds": startup_phases, "warmup": warmup_shapes, "error": model_load_error}
     }
 
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and its event loop responds, even while the model loads."""
+    if model_load_error is not None:
+        raise HTTPException(status_code=500, detail=f"Model failed to load: {model_load_error}")
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: 200 once predictions can be served, 503 with Retry-After before."""
+    require_ready()
+    return {"status": "ready", "startup_seconds": startup_phases.get("ready")}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: request and per-stage latency, batch shapes, queue depth, cache and memory."""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only with the configured admin token; /admin is disabled without one."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.post("/admin/profile", status_code=202, include_in_schema=False, dependencies=[Depends(require_admin)])
+async def start_profile(profile_request: ProfileRequest):
+    """
+    Profile the inference of the next N texts, or for T seconds, in this worker.
+    
+    Args:
+        profile_request: ProfileRequest with the text count and time limit
+        
+    Returns:
+        Status of the capture, including the directory it writes to
+    """
+    try:
+        capture = profiler.start(profile_request.requests, profile_request.seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return capture.status()
+
+
+@app.get("/admin/profile", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def profile_status():
+    """Status of the running or most recent profile capture."""
+    if profiler.capture is None:
+        raise HTTPException(status_code=404, detail="No profile captured yet")
+    return profiler.capture.status()
+
+
+@app.delete("/admin/profile", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def stop_profile():
+    """End the running profile capture early; its results are still written."""
+    if not profiler.active:
+        raise HTTPException(status_code=404, detail="No profile capture running")
+    profiler.stop()
+    return profiler.capture.status()
+
+
 @app.post("/predict", response_model=PredictionResponse)
-async def predict_text(input_data: TextInput) -> PredictionResponse:
+async def predict_text(
+    input_data: TextInput,
+    request: Request,
+    deadline_ms: Optional[float] = Header(None, alias="X-Deadline-Ms", gt=0),
+    priority: Optional[str] = Header(None, alias="X-Priority"),
+    api_key: Optional[str] = Header(None, alias="X-API-Key")
+) -> PredictionResponse:
     """
     Predict the class of the input text using the BERT model.
     
+    The response carries a Server-Timing header with the time spent in each
+    stage (queue, tokenize, forward, postprocess, serialize).
+    
     Args:
         input_data: TextInput object containing the text to classify
+        request: Incoming request, for the optional X-Request-ID header
+        deadline_ms: Optional X-Deadline-Ms header: milliseconds the client will wait for the answer
+        priority: Optional X-Priority header naming the lane, e.g. interactive or bulk
+        api_key: Optional X-API-Key header, which may pin the request to a lane
         
     Returns:
         PredictionResponse containing predicted class, confidence, and probabilities
     """
-    if model is None or tokenizer is None:
+    require_ready()
+    
+    lane = request_lane(priority, api_key)
+    timing = RequestTiming()
+    deadline = timing.submitted + deadline_ms / 1000 if deadline_ms is not None else None
+    try:
+        # Concurrent requests of a lane are grouped into one forward pass by the batcher
+        prediction = await submit_until((input_data.text, timing), lane, request, deadline)
+        
+        # Serialize here rather than in FastAPI so the time is part of the breakdown
+        started = time.perf_counter()
+        response = JSONResponse(content=prediction.model_dump())
+        timing.record("serialize", time.perf_counter() - started)
+        
+        response.headers["Server-Timing"] = timing.server_timing()
+        LANE_LATENCY.labels(lane).observe(time.perf_counter() - timing.submitted)
+        if TIMING_LOG:
+            timing.log("/predict", response.status_code, request.headers.get("x-request-id"))
+        return response
+        
+    except QueueFullError:
+        REQUESTS_SHED.labels(lane, "queue_full").inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests queued. Please retry shortly.",
+            headers={"Retry-After": str(QUEUE_RETRY_AFTER_SECONDS)}
+        )
+    except asyncio.TimeoutError:
+        REQUESTS_SHED.labels(lane, "deadline").inc()
+        raise HTTPException(status_code=504, detail=f"No prediction within the {deadline_ms:g}ms deadline")
+    except ClientDisconnect:
+        REQUESTS_SHED.labels(lane, "disconnected").inc()
+        # Nobody reads this; 499 (nginx's "client closed request") keeps it apart in the metrics
+        return Response(status_code=499)
+    except Exception as e:
+        logger.error(f"Prediction error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction failed: {str(e)}"
+        )
+
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch_texts(
+    input_data: BatchTextInput,
+    request: Request,
+    priority: Optional[str] = Header(None, alias="X-Priority"),
+    api_key: Optional[str] = Header(None, alias="X-API-Key")
+) -> BatchPredictionResponse:
+    """
+    Predict the classes of many texts in one request.
+    
+    Texts are queued in the bulk lane of the batcher, which batches them by
+    length and takes turns with interactive /predict traffic; the results
+    are returned in input order.
+    
+    Args:
+        input_data: BatchTextInput object containing the texts to classify
+        request: Incoming request, watched for a client disconnect
+        priority: Optional X-Priority header naming the lane (default and highest: bulk)
+        api_key: Optional X-API-Key header, which may pin the request to a lane
+        
+    Returns:
+        BatchPredictionResponse with one result per input item
+    """
+    require_ready()
+    
+    lane = request_lane(priority, api_key, BULK_LANE, highest=BULK_LANE)
+    
+    if len(input_data.items) > MAX_BATCH_ITEMS:
         raise HTTPException(
-            status_code=503,
-            detail="Model not loaded. Please check server logs."
+            status_code=413,
+            detail=f"Too many items: {len(input_data.items)} (maximum is {MAX_BATCH_ITEMS})"
         )
     
     try:
-        # Tokenize input text
-        inputs = tokenizer(
-            input_data.text,
-            add_special_tokens=True,
-            max_length=MAX_LENGTH,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
-        )
+        predictions = await predict_in_lane([item.text for item in input_data.items], lane, request)
         
-        # Move inputs to device
-        inputs = {key: value.to(device) for key, value in inputs.items()}
+        return BatchPredictionResponse(results=[
+            BatchPredictionItem(id=item.id, **prediction.model_dump())
+            for item, prediction in zip(input_data.items, predictions)
+        ])
         
-        # Perform inference
-        with torch.no_grad():
-            outputs = model(**inputs)
-            logits = outputs.logits
-            
-            # Apply softmax to get probabilities
-            probabilities = torch.softmax(logits, dim=-1)
-            
-            # Get predicted class
-            predicted_class_id = torch.argmax(probabilities, dim=-1).item()
-            confidence = probabilities[0][predicted_class_id].item()
-        
-        # Get class labels
-        class_labels = get_class_labels()
-        if class_labels:
-            predicted_class = class_labels[predicted_class_id]
-            prob_dict = {
-                class_labels[i]: prob.item() 
-                for i, prob in enumerate(probabilities[0])
-            }
-        else:
-            predicted_class = str(predicted_class_id)
-            prob_dict = {
-                str(i): prob.item() 
-                for i, prob in enumerate(probabilities[0])
-            }
-        
-        return PredictionResponse(
-            predicted_class=predicted_class,
-            confidence=confidence,
-            probabilities=prob_dict
+    except QueueFullError:
+        REQUESTS_SHED.labels(lane, "queue_full").inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests queued. Please retry shortly.",
+            headers={"Retry-After": str(QUEUE_RETRY_AFTER_SECONDS)}
+        )
+    except ClientDisconnect:
+        REQUESTS_SHED.labels(lane, "disconnected").inc()
+        return Response(status_code=499)
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Batch prediction failed: {str(e)}"
         )
+
+
+async def score_stream_batch(batch: List[tuple], lane: str) -> List[bytes]:
+    """Score one batch of parsed stream lines in a lane and render their NDJSON result lines in order."""
+    valid = [(line_number, item) for line_number, item in batch if isinstance(item, BatchItem)]
+    predictions = {}
+    error = None
+    
+    if valid:
+        try:
+            results = await predict_in_lane([item.text for _, item in valid], lane)
+            predictions = {line_number: result for (line_number, _), result in zip(valid, results)}
+        except Exception as e:
+            logger.error(f"Stream batch error: {str(e)}")
+            error = f"Prediction failed: {str(e)}"
+    
+    lines = []
+    for line_number, item in batch:
+        if not isinstance(item, BatchItem):
+            lines.append(ndjson_line({"line": line_number, "error": item}))
+        elif line_number in predictions:
+            lines.append(ndjson_line({"line": line_number, "id": item.id, **predictions[line_number].model_dump()}))
+        else:
+            lines.append(ndjson_line({"line": line_number, "id": item.id, "error": error}))
+    return lines
+
+
+async def score_stream(request: Request, lane: str):
+    """Read NDJSON items from the request body and yield NDJSON results batch by batch."""
+    batch = []
+    try:
+        async for line_number, line in iter_lines(request.stream(), MAX_STREAM_LINE_BYTES):
+            try:
+                batch.append((line_number, BatchItem.model_validate_json(line)))
+            except ValidationError as e:
+                batch.append((line_number, f"Invalid item: {e.errors()[0]['msg']}"))
+            
+            if len(batch) >= STREAM_BATCH_SIZE:
+                for output in await score_stream_batch(batch, lane):
+                    yield output
+                batch = []
+        
+        if batch:
+            for output in await score_stream_batch(batch, lane):
+                yield output
+    
+    except LineTooLongError as e:
+        # Lines before the oversized one are still scored; the stream ends here
+        for output in await score_stream_batch(batch, lane):
+            yield output
+        yield ndjson_line({"error": str(e)})
+
+
+@app.post("/predict/stream", response_class=NDJSONStreamingResponse)
+async def predict_stream(
+    request: Request,
+    priority: Optional[str] = Header(None, alias="X-Priority"),
+    api_key: Optional[str] = Header(None, alias="X-API-Key")
+):
+    """
+    Score a newline-delimited JSON stream of items.
+    
+    Each request line is an object like {"id": "...", "text": "..."}; each
+    response line is the prediction for one input line, tagged with its line
+    number, or an error for that line. Results are streamed back as each
+    internal batch finishes, and the request body is only read as fast as
+    the client consumes results, so memory use stays flat for any corpus size.
+    Lines are scored in the bulk lane unless X-Priority or X-API-Key names a lower one.
+    """
+    require_ready()
+    
+    lane = request_lane(priority, api_key, BULK_LANE, highest=BULK_LANE)
+    return NDJSONStreamingResponse(score_stream(request, lane))
+
+
+@app.post("/predict/long", response_model=LongPredictionResponse)
+async def predict_long_text(
+    input_data: LongTextInput,
+    request: Request,
+    deadline_ms: Optional[float] = Header(None, alias="X-Deadline-Ms", gt=0),
+    priority: Optional[str] = Header(None, alias="X-Priority"),
+    api_key: Optional[str] = Header(None, alias="X-API-Key")
+) -> LongPredictionResponse:
+    """
+    Predict the class of a long text, such as a full diary entry.
+    
+    The text is split into overlapping token windows, which are queued in
+    the bulk lane of the batcher; the window logits are combined into one
+    prediction.
+    
+    Args:
+        input_data: LongTextInput object containing the text and windowing options
+        request: Incoming request, watched for a client disconnect
+        deadline_ms: Optional X-Deadline-Ms header: milliseconds the client will wait for the answer
+        priority: Optional X-Priority header naming the lane (default: bulk)
+        api_key: Optional X-API-Key header, which may pin the request to a lane
+        
+    Returns:
+        LongPredictionResponse with the combined prediction and per-window scores
+    """
+    require_ready()
+    
+    lane = request_lane(priority, api_key, BULK_LANE)
+    submitted = time.perf_counter()
+    deadline = submitted + deadline_ms / 1000 if deadline_ms is not None else None
+    try:
+        response = await predict_long(input_data, lane, request, deadline)
+        LANE_LATENCY.labels(lane).observe(time.perf_counter() - submitted)
+        return response
         
+    except QueueFullError:
+        REQUESTS_SHED.labels(lane, "queue_full").inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests queued. Please retry shortly.",
+            headers={"Retry-After": str(QUEUE_RETRY_AFTER_SECONDS)}
+        )
+    except asyncio.TimeoutError:
+        REQUESTS_SHED.labels(lane, "deadline").inc()
+        raise HTTPException(status_code=504, detail=f"No prediction within the {deadline_ms:g}ms deadline")
+    except ClientDisconnect:
+        REQUESTS_SHED.labels(lane, "disconnected").inc()
+        return Response(status_code=499)
     except Exception as e:
-        logger.error(f"Prediction error: {str(e)}")
+        logger.error(f"Long text prediction error: {str(e)}")
         raise HTTPException(
             status_code=500,
-            detail=f"Prediction failed: {str(e)}"
+            detail=f"Long text prediction failed: {str(e)}"
         )
 
 
 @app.get("/model-info")
 async def get_model_info():
     """Get information about the loaded model."""
-    if model is None:
-        raise HTTPException(
-            status_code=503,
-            detail="Model not loaded"
-        )
+    require_ready()
     
     class_labels = get_class_labels()
     
@@ -225,10 +1285,16 @@ async def get_model_info():
         "max_position_embeddings": getattr(model.config, 'max_position_embeddings', 'Unknown'),
         "vocab_size": getattr(model.config, 'vocab_size', 'Unknown'),
         "class_labels": class_labels,
-        "device": str(device)
+        "device": str(device),
+        "backend": BACKEND
     }
 
 
+# In pre-fork mode the model is loaded here, in the master process
+if PRELOAD_MODEL:
+    preload_model()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,276 @@
+"""
+Inference backends for the BERT text classification model.
+
+The default ``fp32`` backend runs the checkpoint as-is in PyTorch. The
+``int8`` backend applies dynamic quantization to the Linear layers, which
+store their weights as int8 and quantize activations on the fly; on CPU
+this is usually noticeably faster at a small cost in accuracy. The
+``onnx`` backend serves a graph exported with ``export_onnx.py`` from an
+ONNX Runtime CPU session, which fuses BERT's attention, LayerNorm and GELU
+operators.
+
+The tokenizer is loaded from a serialized ``tokenizer.json`` when the
+model directory has one (build it with ``build_tokenizer.py``); otherwise
+transformers rebuilds the fast tokenizer from ``vocab.txt`` on every load.
+
+Run this module to check how closely a backend agrees with fp32:
+
+    python backends.py --backend int8 [--texts texts.jsonl]
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import torch
+from safetensors import safe_open
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+try:
+    from transformers.initialization import no_init_weights
+except ImportError:  # transformers < 5
+    from transformers.modeling_utils import no_init_weights
+
+from inference import encode_texts
+from sample_texts import read_texts
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("fp32", "int8", "onnx")
+ONNX_FILE = "model.onnx"
+WEIGHTS_FILE = "model.safetensors"
+TOKENIZER_FILE = "tokenizer.json"
+VOCAB_FILE = "vocab.txt"
+
+
+def quantize_model(model):
+    """Dynamically quantize the model's Linear layers to int8, in place."""
+    return torch.ao.quantization.quantize_dynamic(
+        model,
+        {torch.nn.Linear},
+        dtype=torch.qint8,
+        inplace=True
+    )
+
+
+class OnnxModel:
+    """
+    ONNX Runtime session that can stand in for the PyTorch model.
+
+    It exposes ``config`` and returns outputs with a ``logits`` tensor, so
+    callers use it exactly like the PyTorch model.
+    """
+
+    def __init__(self, onnx_path: str, config, num_threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("The onnx backend requires onnxruntime: pip install onnxruntime")
+
+        if not Path(onnx_path).exists():
+            raise FileNotFoundError(f"ONNX model not found: {onnx_path} (run export_onnx.py first)")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        self.config = config
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, **inputs) -> SequenceClassifierOutput:
+        feed = {name: inputs[name].cpu().numpy() for name in self.input_names}
+        logits = self.session.run(["logits"], feed)[0]
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+
+def load_mapped_model(model_path: str):
+    """
+    Load the model with its parameters backed by the memory-mapped safetensors file.
+
+    ``from_pretrained`` copies the weights into memory private to the process,
+    so every gunicorn worker would hold its own ~440 MB. Here the model is
+    built without initializing its weights, and its parameters are then
+    pointed at the file's pages, which all processes serving the same file
+    share through the page cache.
+
+    Returns None when the checkpoint does not match the model's parameters
+    exactly (names, shapes and dtypes), e.g. for legacy parameter names that
+    ``from_pretrained`` would rename.
+    """
+    weights_path = Path(model_path, WEIGHTS_FILE)
+    if not weights_path.exists():
+        return None
+
+    config = AutoConfig.from_pretrained(model_path)
+    with no_init_weights():
+        model = AutoModelForSequenceClassification.from_config(config)
+    with safe_open(str(weights_path), framework="pt") as weights:
+        state = {name: weights.get_tensor(name) for name in weights.keys()}
+
+    expected = model.state_dict()
+    if set(state) != set(expected) or any(
+        state[name].shape != expected[name].shape or state[name].dtype != expected[name].dtype
+        for name in state
+    ):
+        logger.warning(f"{weights_path} does not match the model's parameters; copying the weights instead")
+        return None
+    model.load_state_dict(state, assign=True)
+    return model
+
+
+def load_model(model_path: str, device: torch.device, backend: str = "fp32", num_threads: int = 0):
+    """
+    Load the classification model for the given backend.
+
+    Args:
+        model_path: Directory containing config.json and model.safetensors
+        device: Device to run the model on
+        backend: One of BACKENDS
+        num_threads: Intra-op threads for the ONNX Runtime session (0 = its default)
+
+    Returns:
+        Model in evaluation mode, callable as ``model(**inputs).logits``
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}' (expected one of: {', '.join(BACKENDS)})")
+    if backend in ("int8", "onnx") and device.type != "cpu":
+        raise ValueError(f"The {backend} backend only runs on CPU")
+
+    if backend == "onnx":
+        config = AutoConfig.from_pretrained(model_path)
+        onnx_path = os.getenv("FITMIND_ONNX_PATH", str(Path(model_path, ONNX_FILE)))
+        logger.info(f"Loading ONNX Runtime session from {onnx_path}")
+        return OnnxModel(onnx_path, config, num_threads=num_threads)
+
+    # On CPU, serve the weights straight from the file's (shared) pages
+    model = load_mapped_model(model_path) if device.type == "cpu" else None
+    if model is None:
+        model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.to(device)
+    model.eval()
+
+    if backend == "int8":
+        model = quantize_model(model)
+        logger.info("Applied int8 dynamic quantization to Linear layers")
+
+    return model
+
+
+def load_tokenizer_from_vocab(model_path: str):
+    """Build the fast tokenizer from vocab.txt, ignoring any tokenizer.json next to it."""
+    if not Path(model_path, TOKENIZER_FILE).exists():
+        return AutoTokenizer.from_pretrained(model_path)
+
+    # transformers picks up tokenizer.json whenever it is in the directory,
+    # so load from a directory that links every other file
+    with tempfile.TemporaryDirectory() as directory:
+        for path in Path(model_path).iterdir():
+            if path.is_file() and path.name != TOKENIZER_FILE:
+                os.symlink(path.resolve(), Path(directory, path.name))
+        return AutoTokenizer.from_pretrained(directory)
+
+
+def load_tokenizer(model_path: str):
+    """
+    Load the fast tokenizer, from the serialized tokenizer.json if there is one.
+
+    A tokenizer.json that cannot be read or does not match vocab.txt is
+    skipped with a warning, and the tokenizer is rebuilt from vocab.txt.
+
+    Args:
+        model_path: Directory containing the tokenizer files
+
+    Returns:
+        Fast tokenizer
+    """
+    tokenizer_file = Path(model_path, TOKENIZER_FILE)
+    vocab_file = Path(model_path, VOCAB_FILE)
+    started = time.perf_counter()
+
+    if tokenizer_file.exists():
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(model_path, tokenizer_file=str(tokenizer_file))
+            if vocab_file.exists():
+                with open(vocab_file, encoding="utf-8") as f:
+                    vocab_size = sum(1 for _ in f)
+                if len(tokenizer) < vocab_size:
+                    raise ValueError(f"{len(tokenizer)} tokens, but {VOCAB_FILE} has {vocab_size}; rebuild it")
+            logger.info(f"Loaded tokenizer from {tokenizer_file} in {time.perf_counter() - started:.3f}s")
+            return tokenizer
+        except Exception as e:
+            logger.warning(f"Ignoring {tokenizer_file}: {str(e)}")
+    else:
+        logger.info(f"No {TOKENIZER_FILE} in {model_path}; building the tokenizer from {VOCAB_FILE}")
+
+    tokenizer = load_tokenizer_from_vocab(model_path)
+    logger.info(f"Built tokenizer from {vocab_file} in {time.perf_counter() - started:.3f}s")
+    return tokenizer
+
+
+def predict_probabilities(model, tokenizer, texts: List[str], batch_size: int = 16,
+                          device: torch.device = torch.device("cpu")) -> torch.Tensor:
+    """Return the softmax probabilities of a model for each text."""
+    rows = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            inputs = encode_texts(tokenizer, texts[start:start + batch_size])
+            inputs = {key: value.to(device) for key, value in inputs.items()}
+            rows.append(torch.softmax(model(**inputs).logits, dim=-1).cpu())
+    return torch.cat(rows)
+
+
+def compare_to_reference(reference, candidate, tokenizer, texts: List[str]) -> Dict[str, Any]:
+    """
+    Compare a candidate backend against the fp32 reference on the same texts.
+
+    Returns:
+        Label agreement rate and absolute probability drift statistics
+    """
+    expected = predict_probabilities(reference, tokenizer, texts)
+    actual = predict_probabilities(candidate, tokenizer, texts)
+    drift = (expected - actual).abs()
+
+    return {
+        "num_texts": len(texts),
+        "label_agreement": (expected.argmax(dim=-1) == actual.argmax(dim=-1)).float().mean().item(),
+        "mean_abs_prob_drift": drift.mean().item(),
+        "max_abs_prob_drift": drift.max().item(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check how closely an inference backend agrees with fp32")
+    parser.add_argument("--backend", default="int8", choices=[b for b in BACKENDS if b != "fp32"])
+    parser.add_argument("--model-path", default=".", help="Directory containing the model files")
+    parser.add_argument("--texts", help="JSONL or plain-text file of texts to compare on")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    device = torch.device("cpu")
+
+    tokenizer = load_tokenizer(args.model_path)
+    reference = load_model(args.model_path, device, "fp32")
+    candidate = load_model(args.model_path, device, args.backend)
+
+    report = compare_to_reference(reference, candidate, tokenizer, read_texts(args.texts))
+    report["backend"] = args.backend
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
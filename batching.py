@@ -0,0 +1,414 @@
+"""
+Dynamic micro-batching for the BERT text classification API.
+Concurrent requests are collected on the event loop and executed as one batched forward pass.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+def parse_lanes(value: Optional[str], cast: Callable[[str], Any] = float) -> Dict[str, Any]:
+    """
+    Parse a comma-separated lane list such as "interactive:8,bulk:1".
+
+    Returns the lanes in the order given, with their values converted by ``cast``.
+    """
+    lanes = {}
+    for part in (value or "").split(","):
+        if not part.strip():
+            continue
+        name, separator, setting = part.partition(":")
+        if not separator or not name.strip():
+            raise ValueError(f"Invalid lane setting: {part}")
+        lanes[name.strip()] = cast(setting.strip())
+    return lanes
+
+
+class MicroBatcher:
+    """
+    Group concurrently submitted items into batches.
+
+    A batch is dispatched as soon as it is full (``max_batch_size`` items,
+    or its token budget, see below) or ``max_wait_ms`` milliseconds have
+    passed since its first item arrived, whichever comes first.
+    ``process_batch`` receives the list of items and must return one result
+    per item, in the same order.
+
+    When an ``executor`` is given, ``process_batch`` runs on it instead of
+    on the event loop, with up to ``executor.max_workers`` batches in
+    flight. A new batch is only collected once a slot is free, so requests
+    keep accumulating into full batches while the workers are busy.
+
+    ``process_batch`` may also be a coroutine function, e.g. one passing the
+    batch through an ``InferencePipeline``; it is then awaited on the loop,
+    with up to ``max_in_flight`` batches in flight (by default, as many as
+    the executor has workers, or one).
+
+    With a ``cost`` function (e.g. an item's padded length in tokens),
+    batches are formed by cost instead of in arrival order: the cheapest
+    pending item goes first, joined by items within a factor of two of its
+    cost, cheapest first, as long as ``len(batch) * max(cost)`` stays within
+    ``max_batch_tokens``. Short requests thus overtake long ones and are
+    not padded to their length. Items held back for ``max_defer_ms`` or
+    more go first regardless of cost, so long items are never starved.
+
+    With ``max_queue_depth``, ``submit`` raises ``QueueFullError`` instead
+    of queueing once that many items are waiting, so callers can be turned
+    away while the wait is still short.
+
+    Items may be submitted to one of several ``lanes``, a mapping of lane
+    name to weight (by default a single lane). A batch only ever holds items
+    of one lane, and lanes with items waiting take turns by weighted-fair
+    queueing: each batch is charged to its lane as padded tokens (or items,
+    without a ``cost``) divided by the lane's weight, and the lane charged
+    least so far goes next. With weights 8 and 1, a backlogged bulk lane
+    thus gets a ninth of the batches' tokens while interactive traffic is
+    waiting, and everything when it is not. A lane that was idle starts
+    level with the lane being served, rather than with credit saved up.
+    ``lane_limits`` caps the items of a lane queued or running at once;
+    ``submit`` raises ``QueueFullError`` beyond it, or with ``wait=True``
+    waits for one of the lane's items to finish.
+
+    With a ``group`` function, items of different groups never share a
+    batch, e.g. items that ``process_batch`` handles in different ways.
+
+    ``on_queue_change``, if given, is called with the number of queued
+    items whenever it changes, e.g. to export the queue depth as a metric.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        executor: Optional[InferenceExecutor] = None,
+        on_queue_change: Optional[Callable[[int], None]] = None,
+        max_in_flight: Optional[int] = None,
+        cost: Optional[Callable[[Any], int]] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_defer_ms: float = 100.0,
+        max_queue_depth: Optional[int] = None,
+        lanes: Optional[Dict[str, float]] = None,
+        lane_limits: Optional[Dict[str, int]] = None,
+        group: Optional[Callable[[Any], Any]] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must not be negative")
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if max_batch_tokens is not None and max_batch_tokens < 1:
+            raise ValueError("max_batch_tokens must be at least 1")
+        if max_queue_depth is not None and max_queue_depth < 1:
+            raise ValueError("max_queue_depth must be at least 1")
+        lanes = lanes or {"default": 1.0}
+        if any(weight <= 0 for weight in lanes.values()):
+            raise ValueError("Lane weights must be positive")
+        lane_limits = lane_limits or {}
+        if set(lane_limits) - set(lanes):
+            raise ValueError(f"Limits given for unknown lanes: {', '.join(sorted(set(lane_limits) - set(lanes)))}")
+        if any(limit < 1 for limit in lane_limits.values()):
+            raise ValueError("Lane limits must be at least 1")
+
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.on_queue_change = on_queue_change
+        self.max_in_flight = max_in_flight or (executor.max_workers if executor else 1)
+        self.cost = cost
+        self.max_batch_tokens = max_batch_tokens
+        self.max_defer = max_defer_ms / 1000.0
+        self.max_queue_depth = max_queue_depth
+        self.lanes = dict(lanes)
+        self.default_lane = next(iter(self.lanes))
+        self.lane_limits = dict(lane_limits)
+        self.group = group
+        # (item, future, cost, enqueued at, lane) in arrival order
+        self._pending: List[Tuple[Any, asyncio.Future, int, float, str]] = []
+        self._queued_by_lane: Counter = Counter()
+        self._in_flight_by_lane: Counter = Counter()
+        self._lane_freed: Dict[str, asyncio.Event] = {}
+        self._served = {lane: {"batches": 0, "items": 0, "work": 0} for lane in self.lanes}
+        # Weighted-fair queueing: work charged to each lane over its weight,
+        # and the charge of the lane whose batch was started last
+        self._virtual = {lane: 0.0 for lane in self.lanes}
+        self._clock = 0.0
+        self._arrived: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batches: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of submitted items not yet collected into a batch."""
+        return len(self._pending)
+
+    def lane_depths(self) -> Dict[str, int]:
+        """Number of items not yet collected into a batch, per lane."""
+        return {lane: self._queued_by_lane[lane] for lane in self.lanes}
+
+    def lane_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Each lane's weight and limit, its items queued and in flight, and what it was served.
+
+        ``work`` is what the lane was charged for its batches: padded tokens,
+        or items without a ``cost``.
+        """
+        return {
+            lane: {
+                "weight": weight,
+                "max_in_flight": self.lane_limits.get(lane),
+                "queued": self._queued_by_lane[lane],
+                "in_flight": self._in_flight_by_lane[lane],
+                "batches": self._served[lane]["batches"],
+                "items": self._served[lane]["items"],
+                "work": self._served[lane]["work"],
+            }
+            for lane, weight in self.lanes.items()
+        }
+
+    def _queue_changed(self):
+        self._queued_by_lane = Counter(entry[4] for entry in self._pending)
+        if self.on_queue_change is not None:
+            self.on_queue_change(self.queue_depth)
+
+    async def start(self):
+        """Start the background task that drains the queue."""
+        if self.running:
+            return
+        self._pending = []
+        self._arrived = asyncio.Event()
+        self._lane_freed = {lane: asyncio.Event() for lane in self.lanes}
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait * 1000:.1f}, max_in_flight={self.max_in_flight}, "
+            f"max_batch_tokens={self.max_batch_tokens}, max_queue_depth={self.max_queue_depth})"
+        )
+
+    async def stop(self):
+        """Stop the background task and fail any requests still waiting."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        for task in list(self._batches):
+            task.cancel()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+
+        pending, self._pending = self._pending, []
+        for _, future, _, _, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+        self._queue_changed()
+
+        # Wake callers waiting for room in a lane, so they fail instead of waiting forever
+        for event in self._lane_freed.values():
+            event.set()
+
+    async def submit(self, item: Any, lane: Optional[str] = None, wait: bool = False) -> Any:
+        """
+        Queue a single item in a lane (by default the first) and wait for its result.
+
+        Cancelling the wait drops the item if it is still queued, so it is
+        never run. Raises ``QueueFullError`` if ``max_queue_depth`` items are
+        already waiting, or the lane's limit of items in flight is reached
+        (unless ``wait`` is set, which waits for the lane to have room).
+        """
+        if not self.running:
+            raise RuntimeError("Batcher is not running")
+        lane = lane or self.default_lane
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+        limit = self.lane_limits.get(lane)
+        while limit is not None and self._in_flight_by_lane[lane] >= limit:
+            if not wait:
+                raise QueueFullError(f"{self._in_flight_by_lane[lane]} {lane} requests already in flight")
+            self._lane_freed[lane].clear()
+            await self._lane_freed[lane].wait()
+            if not self.running:
+                raise RuntimeError("Batcher stopped")
+        if self.max_queue_depth is not None and len(self._pending) >= self.max_queue_depth:
+            # Callers that went away only leave the queue when the next batch is selected
+            self._pending = [entry for entry in self._pending if not entry[1].done()]
+            self._queue_changed()
+            if len(self._pending) >= self.max_queue_depth:
+                raise QueueFullError(f"{len(self._pending)} requests already queued")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        cost = self.cost(item) if self.cost is not None else 0
+        if not self._queued_by_lane[lane]:
+            self._virtual[lane] = max(self._virtual[lane], self._clock)
+        self._in_flight_by_lane[lane] += 1
+        future.add_done_callback(lambda _: self._finished(lane))
+        self._pending.append((item, future, cost, loop.time(), lane))
+        self._arrived.set()
+        self._queue_changed()
+        return await future
+
+    def _finished(self, lane: str):
+        self._in_flight_by_lane[lane] -= 1
+        self._lane_freed[lane].set()
+
+    async def _collect(self) -> List[tuple]:
+        """Wait for the first item, then for more until the batch is full or the wait expires."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            while not self._pending:
+                self._arrived.clear()
+                await self._arrived.wait()
+            deadline = loop.time() + self.max_wait
+
+            batch, full = self._select(loop.time())
+            while batch and not full:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+                batch, full = self._select(loop.time())
+
+            # Empty only if every pending caller went away
+            if batch:
+                break
+
+        lane = batch[0][4]
+        work = len(batch) * max(entry[2] for entry in batch) if self.cost is not None else len(batch)
+        self._clock = self._virtual[lane]
+        self._virtual[lane] += work / self.lanes[lane]
+        served = self._served[lane]
+        served["batches"] += 1
+        served["items"] += len(batch)
+        served["work"] += work
+
+        taken = {id(entry) for entry in batch}
+        self._pending = [entry for entry in self._pending if id(entry) not in taken]
+        self._queue_changed()
+        return [(item, future) for item, future, _, _, _ in batch]
+
+    def _select(self, now: float) -> Tuple[List[tuple], bool]:
+        """Choose the next batch from the pending items, and tell whether it is full."""
+        # Callers that went away while queued do not need a result
+        queued = len(self._pending)
+        self._pending = [entry for entry in self._pending if not entry[1].done()]
+        if len(self._pending) != queued:
+            self._queue_changed()
+        if not self._pending:
+            return [], False
+
+        # The lane charged least so far goes next; ties go to the lane listed first
+        waiting = {entry[4] for entry in self._pending}
+        lane = min((lane for lane in self.lanes if lane in waiting), key=lambda lane: self._virtual[lane])
+        pending = [entry for entry in self._pending if entry[4] == lane]
+
+        if self.cost is None:
+            pending = self._same_group(pending, pending[0])
+            batch = pending[:self.max_batch_size]
+            return batch, len(batch) == self.max_batch_size
+
+        def order(entry):
+            # Overdue items by age, then the rest by cost
+            if now - entry[3] >= self.max_defer:
+                return 0, entry[3]
+            return 1, entry[2], entry[3]
+
+        head = min(pending, key=order)
+        pending = self._same_group(pending, head)
+        batch, longest = [head], head[2]
+        for entry in sorted(pending, key=order):
+            if len(batch) == self.max_batch_size:
+                break
+            if entry is head or entry[2] > head[2] * 2 or entry[2] * 2 < head[2]:
+                continue
+            cost = max(longest, entry[2])
+            if self.max_batch_tokens is not None and (len(batch) + 1) * cost > self.max_batch_tokens:
+                continue
+            batch.append(entry)
+            longest = cost
+
+        full = len(batch) == self.max_batch_size or (
+            self.max_batch_tokens is not None and (len(batch) + 1) * longest > self.max_batch_tokens
+        )
+        return batch, full
+
+    def _same_group(self, pending: List[tuple], head: tuple) -> List[tuple]:
+        """The pending entries that may share a batch with ``head``."""
+        if self.group is None:
+            return pending
+        group = self.group(head[0])
+        return [entry for entry in pending if self.group(entry[0]) == group]
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _dispatch(self, batch: List[tuple]):
+        try:
+            # Callers that went away while queued do not need a result
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                return
+
+            items = [item for item, _ in batch]
+            try:
+                if asyncio.iscoroutinefunction(self.process_batch):
+                    results = await self.process_batch(items)
+                elif self.executor is not None:
+                    results = await self.executor.run(self.process_batch, items)
+                else:
+                    results = self.process_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"process_batch returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            # Only reached with pending futures if the batch was cancelled
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Batcher stopped"))
+            self._slots.release()
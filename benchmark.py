@@ -0,0 +1,247 @@
+"""
+Microbenchmarks for the inference engine.
+
+Measures tokenization, the forward pass and end-to-end prediction
+(``app.predict_batch``: tokenize, forward, softmax and response models,
+without HTTP or micro-batching) over a sweep of backends, thread counts,
+sequence lengths and batch sizes. Results are written as JSON and can be
+compared against a stored baseline run.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --backends fp32,int8 --threads 1,4 --output bench.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import torch
+
+from backends import BACKENDS, load_model, load_tokenizer
+from inference import encode_texts
+from sample_texts import SAMPLE_TEXTS
+
+STAGES = ("tokenize", "forward", "predict")
+
+# Results are matched with the baseline on these fields
+RESULT_KEY = ("backend", "threads", "seq_len", "batch_size", "stage")
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def make_texts(tokenizer, seq_len: int, count: int) -> List[str]:
+    """
+    Build ``count`` different texts of roughly ``seq_len`` tokens each.
+
+    Texts are cut from a long run of sample sentences at different offsets,
+    so the benchmark does not depend on any cache of repeated inputs.
+    """
+    corpus = " ".join(SAMPLE_TEXTS)
+    token_ids = tokenizer(corpus, add_special_tokens=False)["input_ids"]
+    content_len = max(1, seq_len - 2)
+    while len(token_ids) < content_len + count:
+        token_ids = token_ids + token_ids
+
+    return [tokenizer.decode(token_ids[offset:offset + content_len]) for offset in range(count)]
+
+
+def measure(fn: Callable[[], Any], warmup: int, repeats: int) -> List[float]:
+    """Run ``fn`` ``warmup`` times untimed, then return ``repeats`` latencies in seconds."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def summarize(latencies: List[float], batch_size: int) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered)
+    return {
+        "p50_ms": round(p50 * 1000, 3),
+        "p90_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "texts_per_second": round(batch_size / p50, 1) if p50 > 0 else None,
+    }
+
+
+def benchmark_model(model, tokenizer, backend: str, threads: int, seq_lengths: List[int],
+                    batch_sizes: List[int], stages: List[str], warmup: int, repeats: int) -> List[Dict[str, Any]]:
+    """Benchmark one loaded model over all sequence lengths, batch sizes and stages."""
+    import app
+
+    # End-to-end prediction goes through the API's own code path, minus the caches
+    app.model, app.tokenizer, app.device = model, tokenizer, torch.device("cpu")
+    app.prediction_cache = app.prediction_store = None
+    # ...and pads to seq_len without bucketing, so all stages run at the shape they report
+    app.LENGTH_BUCKETS = None
+
+    results = []
+    for seq_len in seq_lengths:
+        app.MAX_LENGTH = seq_len
+        for batch_size in batch_sizes:
+            texts = make_texts(tokenizer, seq_len, batch_size)
+            inputs = encode_texts(tokenizer, texts, max_length=seq_len, buckets=None)
+
+            def forward():
+                with torch.no_grad():
+                    model(**inputs)
+
+            runs = {
+                "tokenize": lambda: encode_texts(tokenizer, texts, max_length=seq_len, buckets=None),
+                "forward": forward,
+                "predict": lambda: app.predict_batch(texts),
+            }
+            for stage in stages:
+                latencies = measure(runs[stage], warmup, repeats)
+                result = {
+                    "backend": backend,
+                    "threads": threads,
+                    "seq_len": seq_len,
+                    "batch_size": batch_size,
+                    "stage": stage,
+                    "padded_len": inputs["input_ids"].shape[1],
+                    **summarize(latencies, batch_size),
+                }
+                results.append(result)
+                print(
+                    f"{backend:>5} threads={threads:<3} seq_len={seq_len:<4} batch={batch_size:<4} "
+                    f"{stage:<9} p50={result['p50_ms']:>9.2f}ms  {result['texts_per_second']:>9} texts/s",
+                    file=sys.stderr
+                )
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def result_key(result: Dict[str, Any]) -> Tuple:
+    return tuple(result[field] for field in RESULT_KEY)
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+            tolerance: float) -> Tuple[List[str], int]:
+    """
+    Compare p50 latencies with a baseline run.
+
+    Returns the lines of a comparison table and the number of results
+    slower than the baseline by more than ``tolerance`` (a fraction).
+    """
+    previous = {result_key(result): result for result in baseline}
+    lines = [
+        f"{'backend':>7} {'threads':>7} {'seq_len':>7} {'batch':>5} {'stage':<9} "
+        f"{'baseline ms':>11} {'current ms':>10} {'change':>8}"
+    ]
+    regressions = 0
+
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None:
+            change, flag = "new", ""
+        else:
+            ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else 1.0
+            change = f"{(ratio - 1) * 100:+.1f}%"
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif ratio < 1 - tolerance:
+                flag = "  faster"
+        lines.append(
+            f"{result['backend']:>7} {result['threads']:>7} {result['seq_len']:>7} {result['batch_size']:>5} "
+            f"{result['stage']:<9} {before['p50_ms'] if before else '-':>11} {result['p50_ms']:>10} "
+            f"{change:>8}{flag}"
+        )
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tokenization, forward pass and end-to-end prediction")
+    parser.add_argument("--model-path", default=".", help="Directory containing the model files")
+    parser.add_argument("--backends", default="fp32", help=f"Comma-separated backends from: {', '.join(BACKENDS)}")
+    parser.add_argument("--threads", type=parse_ints, default=sorted({1, torch.get_num_threads()}),
+                        help="Comma-separated torch thread counts (default: 1 and torch's default)")
+    parser.add_argument("--seq-lengths", type=parse_ints, default=[32, 128, 512],
+                        help="Comma-separated sequence lengths in tokens (default: 32,128,512)")
+    parser.add_argument("--batch-sizes", type=parse_ints, default=[1, 8, 32],
+                        help="Comma-separated batch sizes (default: 1,8,32)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated stages from: {', '.join(STAGES)}")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed runs per measurement")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs per measurement")
+    parser.add_argument("--output", help="Write results as JSON to this file (e.g. to use as a baseline later)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative p50 slowdown reported as a regression (default: 0.10)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    for backend in backends:
+        if backend not in BACKENDS:
+            parser.error(f"Unknown backend '{backend}' (expected one of: {', '.join(BACKENDS)})")
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"Unknown stage '{stage}' (expected one of: {', '.join(STAGES)})")
+
+    logging.basicConfig(level=logging.WARNING)
+    device = torch.device("cpu")
+    tokenizer = load_tokenizer(args.model_path)
+
+    results = []
+    for backend in backends:
+        for threads in args.threads:
+            torch.set_num_threads(threads)
+            # ONNX Runtime fixes its thread count when the session is created
+            model = load_model(args.model_path, device, backend, num_threads=threads)
+            results.extend(benchmark_model(
+                model, tokenizer, backend, threads, args.seq_lengths, args.batch_sizes,
+                stages, args.warmup, args.repeats
+            ))
+
+    report = {
+        "environment": environment(),
+        "settings": {"warmup": args.warmup, "repeats": args.repeats},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != report["environment"]:
+            print("Warning: the baseline was recorded in a different environment", file=sys.stderr)
+        lines, regressions = compare(results, baseline["results"], args.tolerance)
+        print("\n".join(lines))
+        print(f"\n{regressions} regression(s) beyond {args.tolerance:.0%}")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Serialize the fast tokenizer to tokenizer.json.
+
+The model directory only ships vocab.txt and the tokenizer configs, so
+every process start rebuilds the fast (Rust) tokenizer from the vocabulary.
+This writes the built tokenizer to tokenizer.json, which ``load_tokenizer``
+then loads directly. Before replacing the file, the serialized tokenizer is
+checked to encode the sample texts exactly like the one built from vocab.txt,
+and the load times of both are reported.
+
+Usage:
+    python build_tokenizer.py [--model-path .] [--texts texts.jsonl]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, List
+
+from transformers import AutoTokenizer
+
+from backends import TOKENIZER_FILE, load_tokenizer_from_vocab
+from sample_texts import read_texts
+
+logger = logging.getLogger(__name__)
+
+# Inputs where tokenizers tend to differ: accents, CJK, emoji, odd
+# whitespace, control characters and texts past the maximum length
+EDGE_CASES = [
+    "",
+    "   ",
+    "Café naïve résumé, São Paulo and Zürich",
+    "ÀÉÎÕÜ ß Æ œ",
+    "今天心情很好 今日は疲れた",
+    "feeling 🙂 then 😢 then 🔥🔥",
+    "tabs\tand\nnewlines\r\nnon-breaking\u00a0and zero-width\u200bspaces",
+    "control\x00chars\x1f here",
+    "don't won't I'm y'all state-of-the-art e-mail",
+    "URL https://example.com/a?b=c and e-mail me@example.com #hashtag @mention",
+    "word " * 600,
+]
+
+ENCODING_FIELDS = ("input_ids", "token_type_ids", "attention_mask")
+
+
+def verify(reference, candidate, texts: List[str], max_length: int = 512):
+    """Check that the serialized tokenizer encodes ``texts`` exactly like the reference."""
+    mismatches = 0
+    for text in texts:
+        expected = reference(text, truncation=True, max_length=max_length)
+        actual = candidate(text, truncation=True, max_length=max_length)
+        if any(expected.get(field) != actual.get(field) for field in ENCODING_FIELDS):
+            mismatches += 1
+            logger.error(f"Encodings differ for {text[:60]!r}")
+
+    if reference.do_lower_case != getattr(candidate, "do_lower_case", None):
+        raise RuntimeError("Serialized tokenizer lost do_lower_case; the prediction cache keys depend on it")
+    if mismatches:
+        raise RuntimeError(f"Serialized tokenizer differs on {mismatches} of {len(texts)} texts; do not use it")
+    logger.info(f"Serialized tokenizer matches on all {len(texts)} texts")
+
+
+def load_seconds(load: Callable[[], Any], repeats: int = 5) -> float:
+    """Median time taken by ``load``."""
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        load()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialize the fast tokenizer to tokenizer.json")
+    parser.add_argument("--model-path", default=".", help="Directory containing the model files")
+    parser.add_argument("--texts", help="JSONL or plain-text file of extra texts to verify on")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    output = Path(args.model_path, TOKENIZER_FILE)
+    staging = output.with_name(output.name + ".tmp")
+
+    # Build from vocab.txt even if a (possibly stale) tokenizer.json exists
+    reference = load_tokenizer_from_vocab(args.model_path)
+    reference.backend_tokenizer.save(str(staging))
+
+    try:
+        candidate = AutoTokenizer.from_pretrained(args.model_path, tokenizer_file=str(staging))
+        verify(reference, candidate, read_texts(args.texts) + EDGE_CASES)
+        from_vocab = load_seconds(lambda: load_tokenizer_from_vocab(args.model_path))
+        from_file = load_seconds(
+            lambda: AutoTokenizer.from_pretrained(args.model_path, tokenizer_file=str(staging))
+        )
+    except Exception:
+        staging.unlink()
+        raise
+
+    os.replace(staging, output)
+    logger.info(
+        f"Saved {output}: tokenizer loads in {from_file * 1000:.1f}ms "
+        f"(vs {from_vocab * 1000:.1f}ms from vocab.txt)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+In-memory LRU cache of model logits for the BERT text classification apps.
+Repeated texts (journal UIs, Gradio examples) skip the forward pass entirely.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+
+
+def normalize_text(text: str, lowercase: bool = False) -> str:
+    """
+    Normalize text the way the tokenizer would, so equivalent inputs share a cache entry.
+
+    Runs of whitespace are collapsed (BERT's tokenizer splits on any
+    whitespace), and the text is lowercased only when the tokenizer itself
+    lowercases, so normalization never changes the model's input tokens.
+    """
+    text = " ".join(text.split())
+    return text.lower() if lowercase else text
+
+
+def text_hash(text: str, lowercase: bool = False) -> str:
+    """Hash of the normalized text, used as the cache and store key."""
+    return hashlib.sha256(normalize_text(text, lowercase).encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def model_checksum(model_path: str) -> str:
+    """
+    SHA-256 of the model config and weights.
+
+    Based on file contents rather than modification times, so entries
+    persisted by an earlier deploy of the same model remain valid. Hashing
+    the weights takes well under a second and is done once per process.
+    """
+    digest = hashlib.sha256()
+    for name in ("config.json", "model.safetensors"):
+        path = Path(model_path, name)
+        if not path.exists():
+            continue
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_fingerprint(model_path: str, *parts: Any) -> str:
+    """
+    Identify the served model and everything else that changes its output.
+
+    Combines the model checksum with extra ``parts`` such as the backend or
+    the truncation length.
+    """
+    digest = hashlib.sha256(model_checksum(model_path).encode())
+    digest.update(json.dumps([str(part) for part in parts]).encode())
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache mapping normalized text to logits.
+
+    Entries are keyed by a hash of the normalized text. Each cache belongs
+    to one model fingerprint, so a different model or backend never reads
+    stale entries.
+    Logits are stored rather than probabilities, so post-processing such as
+    temperature scaling can change without invalidating the cache.
+    """
+
+    def __init__(self, fingerprint: str, max_entries: int = 10000, ttl_seconds: float = 3600,
+                 lowercase: bool = False):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.lowercase = lowercase
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, text: str) -> str:
+        return text_hash(text, self.lowercase)
+
+    def get(self, text: str) -> Optional[torch.Tensor]:
+        """Return the cached logits for a text, or None."""
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            logits, stored_at = entry
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return logits
+
+    def put(self, text: str, logits: torch.Tensor):
+        """Store the logits for a text, evicting the least recently used entries if full."""
+        key = self.key(text)
+        with self._lock:
+            self._entries[key] = (logits.detach().cpu().clone(), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "fingerprint": self.fingerprint,
+            }
+
+
+def create_prediction_cache(model_path: str, tokenizer, *fingerprint_parts: Any) -> Optional[PredictionCache]:
+    """
+    Build the prediction cache configured by FITMIND_CACHE_SIZE and FITMIND_CACHE_TTL.
+
+    Returns None when FITMIND_CACHE_SIZE is 0, which disables caching.
+    """
+    max_entries = int(os.getenv("FITMIND_CACHE_SIZE", 10000))
+    if max_entries <= 0:
+        return None
+
+    return PredictionCache(
+        model_fingerprint(model_path, *fingerprint_parts),
+        max_entries=max_entries,
+        ttl_seconds=float(os.getenv("FITMIND_CACHE_TTL", 3600)),
+        lowercase=bool(getattr(tokenizer, "do_lower_case", False))
+    )
@@ -0,0 +1,104 @@
+"""
+Bounded executor for running blocking model inference off the asyncio event loop.
+Tokenization and forward passes run on dedicated threads so the loop only handles I/O.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceExecutor:
+    """
+    Run blocking callables on a fixed-size thread pool.
+
+    At most ``max_workers`` calls are handed to the pool at once; further
+    callers wait on the event loop without occupying a thread. PyTorch and
+    the fast tokenizer release the GIL while they work, so threads are
+    enough to keep the event loop responsive.
+
+    Scheduling overhead is tracked as the time between a call being
+    handed to the pool and starting on a worker thread (dispatch), plus the
+    time between the worker finishing and the awaiting coroutine resuming
+    (resume).
+    """
+
+    def __init__(self, max_workers: int = 1, name: str = "inference"):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        self.max_workers = max_workers
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_workers)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._tasks = 0
+        self._dispatch_total = 0.0
+        self._dispatch_max = 0.0
+        self._resume_total = 0.0
+        self._resume_max = 0.0
+        self._busy_total = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` on the pool and return its result."""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            timing = {}
+
+            def call():
+                timing["started"] = time.perf_counter()
+                try:
+                    return fn(*args)
+                finally:
+                    timing["finished"] = time.perf_counter()
+
+            with self._lock:
+                self._in_flight += 1
+            submitted = time.perf_counter()
+            try:
+                return await loop.run_in_executor(self._pool, call)
+            finally:
+                resumed = time.perf_counter()
+                with self._lock:
+                    self._in_flight -= 1
+                if "finished" in timing:
+                    self._record(
+                        dispatch=timing["started"] - submitted,
+                        busy=timing["finished"] - timing["started"],
+                        resume=resumed - timing["finished"],
+                    )
+
+    def _record(self, dispatch: float, busy: float, resume: float):
+        with self._lock:
+            self._tasks += 1
+            self._dispatch_total += dispatch
+            self._dispatch_max = max(self._dispatch_max, dispatch)
+            self._resume_total += resume
+            self._resume_max = max(self._resume_max, resume)
+            self._busy_total += busy
+
+    def stats(self) -> Dict[str, Any]:
+        """Return task counts and average/maximum scheduling overhead in milliseconds."""
+        with self._lock:
+            tasks = self._tasks or 1
+            return {
+                "max_workers": self.max_workers,
+                "in_flight": self._in_flight,
+                "tasks": self._tasks,
+                "avg_dispatch_ms": round(self._dispatch_total / tasks * 1000, 3),
+                "max_dispatch_ms": round(self._dispatch_max * 1000, 3),
+                "avg_resume_ms": round(self._resume_total / tasks * 1000, 3),
+                "max_resume_ms": round(self._resume_max * 1000, 3),
+                "avg_busy_ms": round(self._busy_total / tasks * 1000, 3),
+            }
+
+    def shutdown(self):
+        """Stop accepting work and wait for running calls to finish."""
+        self._pool.shutdown(wait=True)
+        logger.info(f"Executor '{self.name}' shut down")
@@ -0,0 +1,118 @@
+"""
+Export the BERT classification checkpoint to ONNX for the ONNX Runtime backend.
+
+The exported graph has dynamic batch and sequence axes, so it serves the
+same length-bucketed batches as the PyTorch backends. After exporting, the
+ONNX Runtime outputs are checked against PyTorch on a few sample texts.
+
+Usage:
+    python export_onnx.py [--model-path .] [--output model.onnx] [--optimize]
+
+Then serve it with FITMIND_BACKEND=onnx.
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForSequenceClassification
+
+from backends import OnnxModel, load_tokenizer
+from inference import encode_texts
+from sample_texts import SAMPLE_TEXTS
+
+logger = logging.getLogger(__name__)
+
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+OPSET_VERSION = 17
+
+
+class LogitsOnly(torch.nn.Module):
+    """Wrap the model so the exported graph takes positional inputs and returns only logits."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids
+        ).logits
+
+
+def export(model_path: str, output: Path):
+    """Export the checkpoint in ``model_path`` to ``output``."""
+    tokenizer = load_tokenizer(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+
+    dummy = encode_texts(tokenizer, SAMPLE_TEXTS[:2])
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    logger.info(f"Exporting {model_path} to {output} (opset {OPSET_VERSION})...")
+    with torch.no_grad():
+        torch.onnx.export(
+            LogitsOnly(model),
+            tuple(dummy[name] for name in INPUT_NAMES),
+            str(output),
+            input_names=INPUT_NAMES,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET_VERSION,
+            do_constant_folding=True
+        )
+
+    return model, tokenizer
+
+
+def optimize(output: Path, config):
+    """Apply ONNX Runtime's offline BERT fusions (attention, LayerNorm, GELU) to the exported graph."""
+    from onnxruntime.transformers import optimizer
+
+    optimized = optimizer.optimize_model(
+        str(output),
+        model_type="bert",
+        num_heads=config.num_attention_heads,
+        hidden_size=config.hidden_size
+    )
+    optimized.save_model_to_file(str(output))
+    logger.info(f"Applied BERT graph fusions: {optimized.get_fused_operator_statistics()}")
+
+
+def verify(model, tokenizer, output: Path, config):
+    """Check that ONNX Runtime reproduces the PyTorch logits on the sample texts."""
+    inputs = encode_texts(tokenizer, SAMPLE_TEXTS)
+    with torch.no_grad():
+        expected = model(**inputs).logits
+    actual = OnnxModel(str(output), config)(**inputs).logits
+
+    max_diff = (expected - actual).abs().max().item()
+    agreement = (expected.argmax(dim=-1) == actual.argmax(dim=-1)).float().mean().item()
+    logger.info(f"ONNX Runtime vs PyTorch: max logit difference {max_diff:.2e}, label agreement {agreement:.0%}")
+    if agreement < 1.0:
+        raise RuntimeError("Exported model disagrees with PyTorch; do not serve it")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the classification model to ONNX")
+    parser.add_argument("--model-path", default=".", help="Directory containing the model files")
+    parser.add_argument("--output", help="Output file (default: <model-path>/model.onnx)")
+    parser.add_argument("--optimize", action="store_true", help="Apply ONNX Runtime's BERT graph fusions offline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    output = Path(args.output) if args.output else Path(args.model_path, "model.onnx")
+
+    model, tokenizer = export(args.model_path, output)
+    if args.optimize:
+        optimize(output, model.config)
+    verify(model, tokenizer, output, model.config)
+    logger.info(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
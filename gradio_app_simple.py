@@ -5,18 +5,24 @@ This version avoids FastAPI to prevent Pydantic conflicts.
 
 import gradio as gr
 import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import json
+import os
 from pathlib import Path
 
+from backends import load_model, load_tokenizer
+from cache import create_prediction_cache
+from inference import predict_logits
+
 # Global variables for model and tokenizer
 model = None
 tokenizer = None
 device = None
+backend = os.getenv("FITMIND_BACKEND", "fp32")  # Inference backend: fp32, int8 or onnx
+prediction_cache = None
 
 def load_model_and_tokenizer():
     """Load the BERT model and tokenizer from local files."""
-    global model, tokenizer, device
+    global model, tokenizer, device, prediction_cache
     
     try:
         # Set device
@@ -38,13 +44,14 @@ def load_model_and_tokenizer():
         
         # Load tokenizer
         print("Loading tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(".")
+        tokenizer = load_tokenizer(".")
         
         # Load model
-        print("Loading model...")
-        model = AutoModelForSequenceClassification.from_pretrained(".")
-        model.to(device)
-        model.eval()
+        print(f"Loading model with {backend} backend...")
+        model = load_model(".", device, backend)
+        
+        # Cache logits of repeated texts such as the examples
+        prediction_cache = create_prediction_cache(".", tokenizer, backend, 512)
         
         print("Model and tokenizer loaded successfully!")
         return True
@@ -64,24 +71,12 @@ def predict_text(text):
         if model is None or tokenizer is None:
             return "Model not loaded. Please check the setup.", "", ""
         
-        # Tokenize input text
-        inputs = tokenizer(
-            text,
-            add_special_tokens=True,
-            max_length=512,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
-        )
-        
-        # Move inputs to device
-        inputs = {key: value.to(device) for key, value in inputs.items()}
+        # Tokenize and run the model unless the logits are already cached;
+        # the input is padded only up to its length bucket
+        logits = predict_logits(model, tokenizer, [text], device, cache=prediction_cache, max_length=512)
         
-        # Perform inference
+        # Post-process the logits
         with torch.no_grad():
-            outputs = model(**inputs)
-            logits = outputs.logits
-            
             # Apply softmax to get probabilities
             probabilities = torch.softmax(logits, dim=-1)
             
@@ -128,12 +123,18 @@ def get_model_info():
 - Max Position Embeddings: {getattr(model.config, 'max_position_embeddings', 'Unknown')}
 - Vocabulary Size: {getattr(model.config, 'vocab_size', 'Unknown')}
 - Device: {str(device)}
+- Backend: {backend}
 """
     
     if hasattr(model.config, 'id2label'):
         class_labels = model.config.id2label
         info += f"\n**Class Labels:**\n" + "\n".join([f"- {k}: {v}" for k, v in class_labels.items()])
     
+    if prediction_cache is not None:
+        stats = prediction_cache.stats()
+        info += (f"\n**Prediction Cache:** {stats['entries']} entries, {stats['hits']} hits, "
+                 f"{stats['misses']} misses, {stats['evictions']} evictions")
+    
     return info
 
 # Load model on startup
@@ -0,0 +1,67 @@
+"""
+Gunicorn configuration for multi-worker production serving.
+
+By default the app is imported once in the master process (``preload_app``),
+which imports torch and transformers and loads the model there before
+binding. Workers are then forked from the master and share those pages
+copy-on-write: each worker owns only a few tens of MB, where a worker
+importing torch itself holds some 400 MB of library memory of its own.
+
+With FITMIND_PRELOAD_MODEL=0 the master binds the port right away and each
+worker imports torch and loads the model in the background after it starts
+serving (health checks pass, and /predict answers 503 with Retry-After until
+the model is ready). The fp32 weights are still shared, as they are served
+from the memory-mapped safetensors file, but every worker pays for its own
+torch and transformers. The ``Procfile`` sets it, since platforms that
+health-check the port soon after starting the dyno need it bound first;
+set FITMIND_PRELOAD_MODEL=1 there to trade that for the memory.
+
+Usage:
+    gunicorn app:app -c gunicorn.conf.py
+"""
+
+import glob
+import logging
+import os
+import tempfile
+
+# Tell app.py to load the model at import time, i.e. in the master process
+os.environ.setdefault("FITMIND_PRELOAD_MODEL", "1")
+PRELOAD_MODEL = os.environ["FITMIND_PRELOAD_MODEL"] == "1"
+
+# Workers write their Prometheus samples here so /metrics can aggregate them.
+# Must be set before prometheus_client is imported, and cleared of the last
+# run's samples on each start. Only the sample files are removed, as the
+# directory may be one the operator also uses for other things.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "fitmind-metrics"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+for samples in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+    os.remove(samples)
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = PRELOAD_MODEL
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def when_ready(server):
+    from procinfo import memory_usage
+
+    if PRELOAD_MODEL:
+        logger.info(f"Master memory after preloading model: {memory_usage()}")
+
+
+def post_fork(server, worker):
+    if PRELOAD_MODEL:
+        logger.info(f"Worker {worker.pid} forked from master; model weights are shared copy-on-write")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Drop the live gauges (queue depth, in-flight requests, memory) of the exited worker
+    multiprocess.mark_process_dead(worker.pid)
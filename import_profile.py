@@ -0,0 +1,95 @@
+"""
+Import-time profile of the BERT text classification API.
+
+Imports a module (``app`` by default) in a fresh interpreter with
+``python -X importtime`` and ranks the slowest imports. With ``--deferred``
+it also imports what the API defers until the model loads (torch,
+transformers and the model backends), to show where that time goes.
+
+Usage:
+    python import_profile.py
+    python import_profile.py --deferred --top 30
+
+For a running server, set PYTHONPROFILEIMPORTTIME=1 to get the raw
+per-module timings on stderr.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Modules app.py imports in the background, when the model loads
+DEFERRED = ("torch", "transformers", "backends")
+
+# "import time:      1234 |       5678 |     package.module"
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def run_importtime(module: str, deferred: bool) -> Tuple[Dict[str, float], List[Tuple[str, int, int, int]]]:
+    """
+    Import ``module`` in a subprocess under ``-X importtime``.
+
+    Returns the wall-clock seconds of each import step and the parsed
+    (name, self us, cumulative us, nesting level) records.
+    """
+    steps = [("import", f"import {module}")]
+    if deferred:
+        steps.append(("deferred", "; ".join(f"import {name}" for name in DEFERRED)))
+
+    script = ["import time"]
+    for label, statement in steps:
+        script.append(
+            f"started = time.perf_counter(); {statement}; "
+            f"print('{label}', time.perf_counter() - started)"
+        )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(script)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+
+    wall = {}
+    for line in result.stdout.splitlines():
+        label, _, seconds = line.rpartition(" ")
+        if label in {step for step, _ in steps}:
+            wall[label] = float(seconds)
+
+    records = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return wall, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank the slowest imports of the API")
+    parser.add_argument("--module", default="app", help="Module to import (default: app)")
+    parser.add_argument("--deferred", action="store_true",
+                        help=f"Also import the modules loaded in the background: {', '.join(DEFERRED)}")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules to list (default: 20)")
+    args = parser.parse_args()
+
+    wall, records = run_importtime(args.module, args.deferred)
+
+    for label, seconds in wall.items():
+        print(f"{label:<9} {seconds:8.3f}s")
+
+    print("\nTop-level imports by cumulative time")
+    print(f"{'Cumulative ms':>13} {'Self ms':>9}  Module")
+    top_level = sorted((r for r in records if r[3] == 0), key=lambda r: r[2], reverse=True)
+    for name, self_us, cumulative_us, _ in top_level[:args.top]:
+        print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>9.1f}  {name}")
+
+    print("\nModules by self time")
+    print(f"{'Self ms':>13}  Module")
+    for name, self_us, _, _ in sorted(records, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"{self_us / 1000:>13.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""
+Shared inference helpers for the BERT text classification apps.
+Used by the FastAPI app and the Gradio interfaces so every entry point tokenizes the same way.
+"""
+
+from __future__ import annotations
+
+import copy
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from lazy_imports import lazy_import
+
+# Imported when first used, so importing this module stays fast
+torch = lazy_import("torch")
+
+# Padded sequence lengths used for batches. Padding to a small set of
+# shapes instead of always to 512 keeps short inputs cheap while limiting
+# the number of distinct shapes the model sees.
+LENGTH_BUCKETS = (32, 64, 128, 256, 512)
+
+MODEL_INPUTS = ('input_ids', 'token_type_ids', 'attention_mask')
+
+# Runs of ASCII letters and digits, counted as one WordPiece token per two
+# characters (English averages about four) when sizing batches before the
+# texts are tokenized. Every other character that is not whitespace, after
+# NFD, counts as a token: BERT splits off punctuation and CJK characters,
+# and Hangul syllables decompose into jamo. Estimates therefore err long,
+# except for random strings of ASCII letters and digits such as hashes.
+ALNUM_RUN = re.compile(r"[A-Za-z0-9]+")
+
+# Ways of combining per-window logits in long-document mode
+AGGREGATIONS = ('mean', 'max', 'weighted')
+
+
+def parse_length_buckets(value: Optional[str]) -> Optional[tuple]:
+    """
+    Parse a comma-separated bucket list such as "32,64,128".
+
+    Returns None for "none" or an empty value, meaning pad to the longest sequence.
+    """
+    if value is None:
+        return LENGTH_BUCKETS
+    value = value.strip().lower()
+    if value in ("", "none", "longest"):
+        return None
+    buckets = sorted({int(part) for part in value.split(",") if part.strip()})
+    if not buckets or buckets[0] < 1:
+        raise ValueError(f"Invalid length buckets: {value}")
+    return tuple(buckets)
+
+
+def bucket_length(length: int, buckets: Optional[Sequence[int]] = LENGTH_BUCKETS) -> int:
+    """Round a sequence length up to the nearest bucket (or keep it as-is without buckets)."""
+    if not buckets:
+        return length
+    for bucket in buckets:
+        if length <= bucket:
+            return bucket
+    return length
+
+
+def estimate_tokens(text: str, max_length: int = 512, buckets: Optional[Sequence[int]] = LENGTH_BUCKETS) -> int:
+    """Estimate the padded length of a text (with [CLS] and [SEP]) from its characters, without tokenizing it."""
+    tokens = 2 + sum(len(run) // 2 + 1 for run in ALNUM_RUN.findall(text))
+    tokens += sum(not char.isspace() for char in unicodedata.normalize("NFD", ALNUM_RUN.sub(" ", text)))
+    return min(bucket_length(tokens, buckets), max_length)
+
+
+class ThreadLocalTokenizer:
+    """
+    Give every thread its own copy of a fast tokenizer.
+
+    A fast tokenizer keeps its truncation settings on the shared Rust
+    backend and changes them on every call, so two threads tokenizing at
+    once (e.g. a /predict batch on the pipeline's prepare thread and a long
+    text's windows on the inference thread) can truncate each other's texts
+    or fail with "Already borrowed". Attribute access and calls go to the
+    calling thread's copy; the tokenizer passed in is only ever copied.
+    """
+
+    def __init__(self, tokenizer):
+        self._template = tokenizer
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The calling thread's copy of the tokenizer."""
+        tokenizer = getattr(self._local, "tokenizer", None)
+        if tokenizer is None:
+            with self._lock:
+                tokenizer = copy.deepcopy(self._template)
+            self._local.tokenizer = tokenizer
+        return tokenizer
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        if name in ("_template", "_local", "_lock"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __len__(self) -> int:
+        return len(self._template)
+
+
+def encode_texts(
+    tokenizer,
+    texts: List[str],
+    max_length: int = 512,
+    buckets: Optional[Sequence[int]] = LENGTH_BUCKETS,
+) -> Dict[str, torch.Tensor]:
+    """
+    Tokenize texts and pad them only as far as the batch needs.
+
+    The batch is padded to the longest sequence in it, rounded up to the
+    nearest length bucket and never beyond ``max_length``. Padded positions
+    are masked out by the attention mask, so the logits match those of
+    ``padding='max_length'``.
+
+    Args:
+        tokenizer: Hugging Face tokenizer
+        texts: Texts to encode
+        max_length: Truncation length
+        buckets: Allowed padded lengths, or None to pad to the longest sequence
+
+    Returns:
+        Dictionary of input tensors ready to be passed to the model
+    """
+    encoded = tokenizer(
+        texts,
+        add_special_tokens=True,
+        max_length=max_length,
+        truncation=True,
+        padding=False
+    )
+
+    return pad_encodings(encoded, tokenizer.pad_token_id or 0, max_length, buckets)
+
+
+def pad_encodings(
+    encoded,
+    pad_id: int,
+    max_length: int = 512,
+    buckets: Optional[Sequence[int]] = LENGTH_BUCKETS,
+) -> Dict[str, torch.Tensor]:
+    """Pad unpadded tokenizer output to the batch's length bucket and convert it to tensors."""
+    lengths = [len(ids) for ids in encoded['input_ids']]
+    padded_length = min(bucket_length(max(lengths), buckets), max_length)
+
+    inputs = {}
+    for key in MODEL_INPUTS:
+        if key not in encoded:
+            continue
+        rows = encoded[key]
+        fill = pad_id if key == 'input_ids' else 0
+        tensor = torch.full((len(rows), padded_length), fill, dtype=torch.long)
+        for i, row in enumerate(rows):
+            tensor[i, :len(row)] = torch.tensor(row, dtype=torch.long)
+        inputs[key] = tensor
+
+    return inputs
+
+
+def record_forward(stats: Optional[Dict[str, Any]], inputs: Dict[str, torch.Tensor],
+                   tokenize_seconds: float, forward_seconds: float,
+                   texts: Optional[List[str]] = None):
+    """
+    Add the timings and shapes of one forward pass to a ``stats`` dictionary.
+
+    ``stats`` accumulates over all forward passes of a call: stage times in
+    seconds, plus the batch size, padded length and per-text token counts
+    of every pass. When the ``texts`` of the pass are given, their token
+    counts are also kept by text under ``text_tokens``. Nothing is recorded
+    when ``stats`` is None.
+    """
+    if stats is None:
+        return
+    stats['tokenize_seconds'] = stats.get('tokenize_seconds', 0.0) + tokenize_seconds
+    stats['forward_seconds'] = stats.get('forward_seconds', 0.0) + forward_seconds
+    batch_size, padded_length = inputs['input_ids'].shape
+    token_lengths = inputs['attention_mask'].sum(dim=1).tolist()
+    stats.setdefault('batch_sizes', []).append(batch_size)
+    stats.setdefault('padded_lengths', []).append(padded_length)
+    stats.setdefault('token_lengths', []).extend(token_lengths)
+    if texts is not None:
+        stats.setdefault('text_tokens', {}).update(zip(texts, token_lengths))
+
+
+def warm_up(
+    model,
+    tokenizer,
+    device: torch.device,
+    batch_sizes: Sequence[int],
+    max_length: int = 512,
+    buckets: Optional[Sequence[int]] = LENGTH_BUCKETS,
+    rounds: int = 1,
+    max_batch_tokens: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run synthetic batches at every shape the service pads to.
+
+    The first forward pass at a new shape pays for allocator growth and
+    kernel selection (e.g. oneDNN primitive creation); doing it here keeps
+    that cost out of the first real requests. Each length bucket up to
+    ``max_length`` is combined with each batch size. With
+    ``max_batch_tokens``, batch sizes over a bucket's budget are warmed at
+    the largest size the budget allows there, as that is what is served.
+
+    Returns:
+        One entry per shape with the duration of each round in milliseconds
+    """
+    lengths = sorted({min(bucket, max_length) for bucket in (buckets or LENGTH_BUCKETS)})
+    # Long enough to fill the largest bucket after truncation
+    text = " ".join(["warmup"] * max_length)
+    shapes = []
+
+    for length in lengths:
+        sizes = batch_sizes
+        if max_batch_tokens is not None:
+            largest = max(1, max_batch_tokens // length)
+            sizes = sorted({min(batch_size, largest) for batch_size in batch_sizes})
+        for batch_size in sizes:
+            durations = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                encoded = tokenizer(
+                    [text] * batch_size,
+                    add_special_tokens=True,
+                    max_length=length,
+                    truncation=True,
+                    padding=False
+                )
+                inputs = pad_encodings(encoded, tokenizer.pad_token_id, max_length, (length,))
+                inputs = {key: value.to(device) for key, value in inputs.items()}
+                with torch.no_grad():
+                    model(**inputs)
+                durations.append(round((time.perf_counter() - started) * 1000, 1))
+            shapes.append({"batch_size": batch_size, "length": length, "ms": durations})
+
+    return shapes
+
+
+def run_model(
+    model,
+    tokenizer,
+    texts: List[str],
+    device: torch.device,
+    max_length: int = 512,
+    buckets: Optional[Sequence[int]] = LENGTH_BUCKETS,
+    stats: Optional[Dict[str, Any]] = None,
+) -> torch.Tensor:
+    """Tokenize texts, run one forward pass and return the logits on the CPU."""
+    started = time.perf_counter()
+    inputs = encode_texts(tokenizer, texts, max_length=max_length, buckets=buckets)
+    tokenized = time.perf_counter()
+
+    logits = forward_logits(model, inputs, device)
+
+    record_forward(stats, inputs, tokenized - started, time.perf_counter() - tokenized, texts)
+    return logits
+
+
+def forward_logits(model, inputs: Dict[str, torch.Tensor], device: torch.device) -> torch.Tensor:
+    """Run one forward pass over encoded inputs and return the logits on the CPU."""
+    device_inputs = {key: value.to(device) for key, value in inputs.items()}
+    with torch.no_grad():
+        return model(**device_inputs).logits.cpu()
+
+
+def lookup_logits(
+    texts: List[str],
+    cache=None,
+    store=None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, torch.Tensor], List[str]]:
+    """
+    Look texts up in the in-memory cache, then in the persistent store.
+
+    Store hits are copied into the cache. Hits and misses of each tier are counted in ``stats``.
+
+    Returns:
+        Logits found, by text, and the distinct texts found in neither, in first-seen order
+    """
+    found: Dict[str, torch.Tensor] = {}
+    if cache is not None:
+        for text in dict.fromkeys(texts):
+            logits = cache.get(text)
+            if logits is not None:
+                found[text] = logits
+
+    missing = [text for text in dict.fromkeys(texts) if text not in found]
+    if stats is not None and cache is not None:
+        stats['cache_hits'] = stats.get('cache_hits', 0) + len(found)
+        stats['cache_misses'] = stats.get('cache_misses', 0) + len(missing)
+    if missing and store is not None:
+        stored = store.get_many(missing)
+        if stats is not None:
+            stats['store_hits'] = stats.get('store_hits', 0) + len(stored)
+            stats['store_misses'] = stats.get('store_misses', 0) + len(missing) - len(stored)
+        if cache is not None:
+            for text, logits in stored.items():
+                cache.put(text, logits)
+        found.update(stored)
+        missing = [text for text in missing if text not in stored]
+
+    return found, missing
+
+
+def remember_logits(computed: Dict[str, torch.Tensor], cache=None, store=None):
+    """Add freshly computed logits to the cache and the store."""
+    if cache is not None:
+        for text, logits in computed.items():
+            cache.put(text, logits)
+    if store is not None:
+        store.put_many(computed)
+
+
+def predict_logits(
+    model,
+    tokenizer,
+    texts: List[str],
+    device: torch.device,
+    cache=None,
+    store=None,
+    max_length: int = 512,
+    buckets: Optional[Sequence[int]] = LENGTH_BUCKETS,
+    stats: Optional[Dict[str, Any]] = None,
+) -> torch.Tensor:
+    """
+    Return the logits for each text, using the prediction cache and store when given.
+
+    Texts are looked up in the in-memory cache first, then in the persistent
+    store; only texts found in neither are run through the model, in a
+    single forward pass. Duplicates within the batch are computed once.
+    Cache and store hits are counted in ``stats`` alongside the forward
+    pass details (see ``record_forward``).
+
+    Returns:
+        Tensor of shape (len(texts), num_labels)
+    """
+    if cache is None and store is None:
+        return run_model(model, tokenizer, texts, device, max_length, buckets, stats)
+
+    found, missing = lookup_logits(texts, cache, store, stats)
+
+    if missing:
+        computed = dict(zip(missing, run_model(model, tokenizer, missing, device, max_length, buckets, stats)))
+        remember_logits(computed, cache, store)
+        found.update(computed)
+
+    return torch.stack([found[text] for text in texts])
+
+
+def encode_windows(
+    tokenizer,
+    text: str,
+    window_size: int = 512,
+    stride: int = 128,
+) -> Tuple[List[Dict[str, List[int]]], List[Tuple[int, int]]]:
+    """
+    Split a long text into overlapping token windows.
+
+    The text is tokenized once and split into windows of ``window_size``
+    tokens (including [CLS] and [SEP]) that overlap by ``stride`` tokens,
+    so the cost of classifying them grows linearly with the length of the
+    text. The windows are left unpadded, to be padded per batch with
+    ``pad_encodings``.
+
+    Returns:
+        Each window's model inputs and the [start, end) range of text tokens
+        it covers
+    """
+    encoded = tokenizer(
+        text,
+        add_special_tokens=True,
+        max_length=window_size,
+        truncation=True,
+        stride=stride,
+        return_overflowing_tokens=True,
+        padding=False
+    )
+
+    step = window_size - tokenizer.num_special_tokens_to_add() - stride
+    windows, spans = [], []
+    for i, ids in enumerate(encoded['input_ids']):
+        start = i * step
+        spans.append((start, start + len(ids) - tokenizer.num_special_tokens_to_add()))
+        windows.append({key: encoded[key][i] for key in MODEL_INPUTS if key in encoded})
+
+    return windows, spans
+
+
+def aggregate_logits(logits: torch.Tensor, spans: List[Tuple[int, int]], method: str = 'mean') -> torch.Tensor:
+    """
+    Combine per-window logits into one row of document logits.
+
+    ``mean`` averages the windows, ``max`` takes each class's highest logit
+    and ``weighted`` averages the windows weighted by how many tokens they
+    cover (or like ``mean`` if they cover none, e.g. for a blank text).
+    """
+    if method == 'mean':
+        return logits.mean(dim=0)
+    if method == 'max':
+        return logits.max(dim=0).values
+    if method == 'weighted':
+        weights = torch.tensor([end - start for start, end in spans], dtype=logits.dtype)
+        if weights.sum() == 0:
+            return logits.mean(dim=0)
+        return (logits * weights.unsqueeze(-1)).sum(dim=0) / weights.sum()
+    raise ValueError(f"Unknown aggregation '{method}' (expected one of: {', '.join(AGGREGATIONS)})")
@@ -0,0 +1,44 @@
+"""
+Deferred imports for the BERT text classification API.
+
+Importing torch and transformers takes seconds, most of the time from
+process start to a bound port. Modules on the API's import path bind torch
+with ``lazy_import`` instead, so the server can start listening at once and
+pay for the import when the model loads in the background.
+"""
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return module ``name``, executing it only on first attribute access.
+
+    An already imported module is returned as is. The deferred import is
+    not thread-safe on older Pythons, so the first access should come from
+    one thread (the model loader calls ``load_deferred`` before anything
+    else touches the module).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def load_deferred(*names: str):
+    """Run the real import of lazily imported (or not yet imported) modules now."""
+    for name in names:
+        module = importlib.import_module(name)
+        # Any attribute access executes a lazy module
+        getattr(module, "__name__")
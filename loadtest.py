@@ -0,0 +1,359 @@
+"""
+HTTP load generator for the BERT text classification API.
+
+Replays a traffic file (JSONL with a "text" or "body" field, or one text
+per line) or synthetic texts with a given length distribution against a
+running server, either closed-loop (a fixed number of concurrent clients)
+or open-loop (Poisson arrivals at a fixed rate, which keeps sending while
+the server falls behind). Reports throughput, latency percentiles, error
+and 503 rates, and the server's memory over time.
+
+Usage:
+    python loadtest.py --start-server uvicorn --traffic requests.jsonl --concurrency 16 --duration 60
+    python loadtest.py --url http://localhost:8000 --server-pid 1234 --rate 50 --duration 60
+    python loadtest.py --start-server gunicorn --workers 4 --synthetic-lengths 10:0.6,40:0.3,80:0.1 --rate 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from procinfo import memory_usage, process_tree
+from sample_texts import SAMPLE_TEXTS, read_texts
+
+
+def synthetic_texts(spec: str, count: int, seed: int) -> List[str]:
+    """
+    Build texts whose word counts follow a distribution like ``10:0.6,40:0.3,80:0.1``.
+
+    Each entry is ``words:weight``; words are drawn from the sample texts.
+    """
+    rng = random.Random(seed)
+    words = " ".join(SAMPLE_TEXTS).split()
+    lengths, weights = [], []
+    for entry in spec.split(","):
+        length, _, weight = entry.partition(":")
+        lengths.append(int(length))
+        weights.append(float(weight or 1))
+
+    return [
+        " ".join(rng.choice(words) for _ in range(length))
+        for length in rng.choices(lengths, weights=weights, k=count)
+    ]
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values``, or None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class Recorder:
+    """Collects the outcome of every request, relative to the start of the run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.results: List[tuple] = []  # (completed at, latency, status)
+        self.memory: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+    def record(self, latency: float, status: str):
+        self.results.append((time.perf_counter() - self.started, latency, status))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, text: str, recorder: Recorder,
+               scheduled: Optional[float] = None, headers: Optional[Dict[str, str]] = None):
+    """
+    Send one request and record its latency and status.
+
+    In open-loop mode, latency counts from when the request was scheduled,
+    so time spent waiting behind a saturated server is not hidden.
+    """
+    started = scheduled if scheduled is not None else time.perf_counter()
+    try:
+        response = await client.post(endpoint, json={"text": text}, headers=headers)
+        status = str(response.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    recorder.record(time.perf_counter() - started, status)
+
+
+def finished(recorder: Recorder, sent: int, duration: Optional[float], max_requests: Optional[int]) -> bool:
+    if max_requests is not None and sent >= max_requests:
+        return True
+    return duration is not None and recorder.elapsed() >= duration
+
+
+async def closed_loop(client: httpx.AsyncClient, endpoint: str, texts: List[str], recorder: Recorder,
+                      concurrency: int, duration: Optional[float], max_requests: Optional[int],
+                      headers: Optional[Dict[str, str]] = None):
+    """Keep ``concurrency`` requests outstanding: each client sends its next request when the last returns."""
+    sent = 0
+
+    async def client_loop():
+        nonlocal sent
+        while not finished(recorder, sent, duration, max_requests):
+            text = texts[sent % len(texts)]
+            sent += 1
+            await send(client, endpoint, text, recorder, headers=headers)
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+
+async def open_loop(client: httpx.AsyncClient, endpoint: str, texts: List[str], recorder: Recorder,
+                    rate: float, duration: Optional[float], max_requests: Optional[int],
+                    max_outstanding: int, seed: int, headers: Optional[Dict[str, str]] = None):
+    """Send requests with exponentially distributed gaps averaging ``rate`` per second."""
+    rng = random.Random(seed)
+    tasks = set()
+    sent = 0
+    scheduled = time.perf_counter()
+
+    while not finished(recorder, sent, duration, max_requests):
+        scheduled += rng.expovariate(rate)
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        text = texts[sent % len(texts)]
+        sent += 1
+        if len(tasks) >= max_outstanding:
+            # The client itself is saturated; count the request instead of queueing it
+            recorder.dropped += 1
+            continue
+        task = asyncio.create_task(send(client, endpoint, text, recorder, scheduled, headers))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks)
+
+
+async def sample_memory(server_pid: int, recorder: Recorder, interval: float, stop: asyncio.Event):
+    """Record the memory of the server and its worker processes every ``interval`` seconds."""
+    while not stop.is_set():
+        processes = [memory_usage(pid) for pid in process_tree(server_pid)]
+        recorder.memory.append({
+            "second": round(recorder.elapsed(), 1),
+            "processes": len(processes),
+            "rss_mb": round(sum(p["rss_mb"] or 0 for p in processes), 1),
+            # PSS adds up shared pages only once, so it is the honest total for forked workers
+            "pss_mb": round(sum(p["pss_mb"] or 0 for p in processes), 1),
+        })
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_server(kind: str, port: int, workers: int) -> subprocess.Popen:
+    if kind == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "app:app", "-c", "gunicorn.conf.py"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)]
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    print(f"Starting server: {' '.join(command)}", file=sys.stderr)
+    return subprocess.Popen(command, env=env)
+
+
+def wait_until_ready(url: str, timeout: float, server: Optional[subprocess.Popen]):
+    """Poll /health/ready until the model is loaded."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            if httpx.get(f"{url}/health/ready", timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} not ready after {timeout:.0f}s")
+
+
+def timeline(recorder: Recorder) -> List[Dict[str, Any]]:
+    """Per-second throughput, latency and errors."""
+    seconds: Dict[int, List[tuple]] = {}
+    for completed, latency, status in recorder.results:
+        seconds.setdefault(int(completed), []).append((latency, status))
+
+    rows = []
+    for second in range(int(recorder.elapsed()) + 1):
+        results = seconds.get(second, [])
+        latencies = [latency for latency, status in results if status == "200"]
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+        rows.append({
+            "second": second,
+            "completed": len(results),
+            "errors": sum(1 for _, status in results if status != "200"),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+        })
+    return rows
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Any]:
+    total = len(recorder.results)
+    statuses: Dict[str, int] = {}
+    for _, _, status in recorder.results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = [latency for _, latency, status in recorder.results if status == "200"]
+    ok = statuses.get("200", 0)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "requests": total,
+        "dropped_by_client": recorder.dropped,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(ok / elapsed, 1) if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 0.5)),
+            "p90": ms(percentile(latencies, 0.9)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "max": ms(max(latencies) if latencies else None),
+        },
+        "status_counts": statuses,
+        "error_rate": round((total - ok) / total, 4) if total else 0.0,
+        "rate_503": round(statuses.get("503", 0) / total, 4) if total else 0.0,
+        "rate_429": round(statuses.get("429", 0) / total, 4) if total else 0.0,
+        "rate_504": round(statuses.get("504", 0) / total, 4) if total else 0.0,
+        "memory": {
+            "start_pss_mb": recorder.memory[0]["pss_mb"] if recorder.memory else None,
+            "peak_pss_mb": max((m["pss_mb"] for m in recorder.memory), default=None),
+            "end_pss_mb": recorder.memory[-1]["pss_mb"] if recorder.memory else None,
+            "samples": recorder.memory,
+        },
+        "timeline": timeline(recorder),
+    }
+
+
+async def run(args, texts: List[str], server_pid: Optional[int]) -> Dict[str, Any]:
+    recorder = Recorder()
+    stop = asyncio.Event()
+    sampler = None
+    if server_pid is not None:
+        sampler = asyncio.create_task(sample_memory(server_pid, recorder, args.memory_interval, stop))
+
+    headers = {}
+    if args.deadline_ms:
+        headers["X-Deadline-Ms"] = str(args.deadline_ms)
+    if args.priority:
+        headers["X-Priority"] = args.priority
+    connections = args.concurrency if args.rate is None else args.max_outstanding
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        if args.rate is None:
+            await closed_loop(client, args.endpoint, texts, recorder, args.concurrency, args.duration, args.requests,
+                              headers)
+        else:
+            await open_loop(client, args.endpoint, texts, recorder, args.rate, args.duration, args.requests,
+                            args.max_outstanding, args.seed, headers)
+    elapsed = recorder.elapsed()
+
+    stop.set()
+    if sampler is not None:
+        await sampler
+
+    report = summarize(recorder, elapsed)
+    report["settings"] = {
+        "mode": "closed" if args.rate is None else "open",
+        "concurrency": args.concurrency if args.rate is None else None,
+        "rate": args.rate,
+        "endpoint": args.endpoint,
+        "deadline_ms": args.deadline_ms,
+        "priority": args.priority,
+        "texts": len(texts),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay traffic against the API and report latency and throughput")
+    parser.add_argument("--url", default=None, help="Base URL of a running server (default: the started one)")
+    parser.add_argument("--start-server", choices=["uvicorn", "gunicorn"], help="Start app.py locally for the run")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --start-server (default: 8765)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for --start-server gunicorn")
+    parser.add_argument("--server-pid", type=int, help="PID of an already running server, to sample its memory")
+    parser.add_argument("--endpoint", default="/predict", help="Endpoint taking {\"text\": ...} (default: /predict)")
+    parser.add_argument("--traffic", help="JSONL (\"text\" or \"body\" field) or plain text file to replay")
+    parser.add_argument("--synthetic-lengths", help="Word-count distribution for synthetic texts, e.g. 10:0.6,40:0.4")
+    parser.add_argument("--synthetic-count", type=int, default=1000, help="Number of synthetic texts")
+    parser.add_argument("--max-chars", type=int, default=512,
+                        help="Skip texts longer than this, which /predict rejects with 422 (default: 512, 0 keeps all)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients in closed-loop mode")
+    parser.add_argument("--rate", type=float, help="Arrivals per second; switches to open-loop mode")
+    parser.add_argument("--max-outstanding", type=int, default=1000,
+                        help="Open-loop requests in flight before further arrivals are dropped")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run (default: 30)")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests instead")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--deadline-ms", type=float, help="Send this X-Deadline-Ms header with every request")
+    parser.add_argument("--priority", help="Send this X-Priority header (lane) with every request, e.g. bulk")
+    parser.add_argument("--memory-interval", type=float, default=1.0, help="Seconds between server memory samples")
+    parser.add_argument("--startup-timeout", type=float, default=300, help="Seconds to wait for the server's model")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic texts and arrival times")
+    parser.add_argument("--output", help="Write the full JSON report to this file")
+    args = parser.parse_args()
+
+    if args.synthetic_lengths:
+        texts = synthetic_texts(args.synthetic_lengths, args.synthetic_count, args.seed)
+    else:
+        texts = read_texts(args.traffic)
+    skipped = 0
+    if args.max_chars:
+        kept = [text for text in texts if len(text) <= args.max_chars]
+        skipped = len(texts) - len(kept)
+        texts = kept
+        if skipped:
+            print(f"Skipping {skipped} texts over {args.max_chars} characters", file=sys.stderr)
+    if not texts:
+        parser.error("No texts to send")
+    if args.requests is not None:
+        args.duration = None
+
+    server = None
+    server_pid = args.server_pid
+    if args.start_server:
+        server = start_server(args.start_server, args.port, args.workers)
+        server_pid = server.pid
+    args.url = args.url or f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_until_ready(args.url, args.startup_timeout, server)
+        report = asyncio.run(run(args, texts, server_pid))
+        report["settings"]["skipped_texts"] = skipped
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+    latency = report["latency_ms"]
+    print(
+        f"{report['requests']} requests in {report['elapsed_seconds']}s: {report['throughput_rps']} req/s, "
+        f"p50={latency['p50']}ms p90={latency['p90']}ms p99={latency['p99']}ms, "
+        f"errors={report['error_rate']:.2%} (503: {report['rate_503']:.2%}, 429: {report['rate_429']:.2%}, "
+        f"504: {report['rate_504']:.2%}), "
+        f"peak server PSS={report['memory']['peak_pss_mb']}MB",
+        file=sys.stderr
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps({key: value for key, value in report.items() if key != "timeline"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Prometheus metrics for the BERT text classification API.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does this)
+so /metrics aggregates the samples of all workers rather than reporting
+whichever worker happens to serve the scrape.
+"""
+
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+
+from procinfo import memory_usage
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+SEQUENCE_LENGTH_BUCKETS = (8, 16, 32, 64, 128, 256, 384, 512)
+BATCH_TOKENS_BUCKETS = (32, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# Refresh the memory gauges at most this often outside of scrapes
+MEMORY_REFRESH_SECONDS = 5.0
+
+REQUEST_LATENCY = Histogram(
+    "fitmind_request_duration_seconds",
+    "HTTP request latency, from receiving the request to sending the last byte",
+    ["method", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "fitmind_requests_total",
+    "HTTP requests by endpoint and status code",
+    ["method", "endpoint", "status"],
+)
+STAGE_LATENCY = Histogram(
+    "fitmind_stage_duration_seconds",
+    "Time spent per inference stage and batch (tokenize, forward, postprocess)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+BATCH_SIZE = Histogram(
+    "fitmind_batch_size",
+    "Number of texts per forward pass",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+BATCH_TOKENS = Histogram(
+    "fitmind_batch_tokens",
+    "Padded tokens per forward pass (batch size times padded length)",
+    buckets=BATCH_TOKENS_BUCKETS,
+)
+SEQUENCE_LENGTH = Histogram(
+    "fitmind_sequence_length_tokens",
+    "Sequence lengths: real tokens per text, and padded length per forward pass",
+    ["kind"],
+    buckets=SEQUENCE_LENGTH_BUCKETS,
+)
+QUEUE_DEPTH = Gauge(
+    "fitmind_queue_depth",
+    "Requests waiting in the micro-batching queue",
+    multiprocess_mode="livesum",
+)
+LANE_QUEUE_DEPTH = Gauge(
+    "fitmind_lane_queue_depth",
+    "Requests waiting in the micro-batching queue, per priority lane",
+    ["lane"],
+    multiprocess_mode="livesum",
+)
+LANE_LATENCY = Histogram(
+    "fitmind_lane_request_duration_seconds",
+    "Latency of each text scored per priority lane: a /predict or /predict/long request, or one bulk text",
+    ["lane"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_SHED = Counter(
+    "fitmind_requests_shed_total",
+    "Requests turned away or dropped before inference, by lane and reason (queue_full, deadline, disconnected)",
+    ["lane", "reason"],
+)
+IN_FLIGHT = Gauge(
+    "fitmind_in_flight_requests",
+    "HTTP requests currently being handled",
+    multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "fitmind_cache_lookups_total",
+    "Prediction cache lookups by tier (memory, store) and result (hit, miss)",
+    ["tier", "result"],
+)
+PROCESS_MEMORY = Gauge(
+    "fitmind_process_memory_bytes",
+    "Process memory: rss includes shared model weights, uss is private to the process",
+    ["kind"],
+    multiprocess_mode="liveall",
+)
+
+_memory_updated = 0.0
+
+
+def observe_inference(stats: Dict[str, Any], postprocess_seconds: Optional[float] = None):
+    """Record the stage timings, shapes and cache lookups collected by the inference helpers."""
+    if "tokenize_seconds" in stats:
+        STAGE_LATENCY.labels("tokenize").observe(stats["tokenize_seconds"])
+        STAGE_LATENCY.labels("forward").observe(stats["forward_seconds"])
+    if postprocess_seconds is not None:
+        STAGE_LATENCY.labels("postprocess").observe(postprocess_seconds)
+
+    for batch_size in stats.get("batch_sizes", ()):
+        BATCH_SIZE.observe(batch_size)
+    for padded_length in stats.get("padded_lengths", ()):
+        SEQUENCE_LENGTH.labels("padded").observe(padded_length)
+    for batch_size, padded_length in zip(stats.get("batch_sizes", ()), stats.get("padded_lengths", ())):
+        BATCH_TOKENS.observe(batch_size * padded_length)
+    for token_length in stats.get("token_lengths", ()):
+        SEQUENCE_LENGTH.labels("tokens").observe(token_length)
+
+    if "cache_hits" in stats:
+        CACHE_LOOKUPS.labels("memory", "hit").inc(stats["cache_hits"])
+        CACHE_LOOKUPS.labels("memory", "miss").inc(stats["cache_misses"])
+    if "store_hits" in stats:
+        CACHE_LOOKUPS.labels("store", "hit").inc(stats["store_hits"])
+        CACHE_LOOKUPS.labels("store", "miss").inc(stats["store_misses"])
+
+
+def update_memory(force: bool = False):
+    """Refresh the memory gauges of this process (rate limited unless forced)."""
+    global _memory_updated
+
+    now = time.monotonic()
+    if not force and now - _memory_updated < MEMORY_REFRESH_SECONDS:
+        return
+    _memory_updated = now
+
+    for kind, value in memory_usage().items():
+        if kind.endswith("_mb") and value is not None:
+            PROCESS_MEMORY.labels(kind[:-3]).set(value * 1024 * 1024)
+
+
+def render() -> Tuple[bytes, str]:
+    """Return the metrics in the Prometheus text format, aggregated over workers if configured."""
+    update_memory(force=True)
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency, status codes and in-flight requests.
+
+    Written as plain ASGI rather than with ``@app.middleware("http")`` so
+    streaming request and response bodies pass through untouched.
+    """
+
+    def __init__(self, app, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], endpoint).observe(time.perf_counter() - started)
+            REQUESTS.labels(scope["method"], endpoint, str(status["code"])).inc()
+            update_memory()
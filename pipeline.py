@@ -0,0 +1,76 @@
+"""
+Staged inference pipeline for the BERT text classification API.
+Each stage of a batch runs on its own thread, so consecutive batches overlap.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class InferencePipeline:
+    """
+    Pass batches through a fixed sequence of stages, each on its own executor.
+
+    A stage is called as ``fn(value, stats)`` with the previous stage's
+    result (or the batch itself) and the batch's ``stats`` dictionary, and
+    its result is handed to the next stage. With separate threads for e.g.
+    tokenization, the forward pass and response building, batch N+1 is
+    tokenized and batch N-1 formatted while batch N runs through the model.
+
+    The pipeline does not limit how many batches enter it: callers should
+    keep at most ``max_in_flight`` batches in it, so at most that many are
+    ever waiting between stages. Time spent waiting for a stage to become
+    free is added to ``stats['wait_seconds']`` and tracked per stage.
+    """
+
+    def __init__(self, stages: List[Tuple[str, Callable[[Any, Dict[str, Any]], Any], InferenceExecutor]]):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+
+        self.stages = stages
+        self._lock = threading.Lock()
+        self._waits = {name: {"batches": 0, "total": 0.0, "max": 0.0} for name, _, _ in stages}
+
+    @property
+    def max_in_flight(self) -> int:
+        """Batches needed to keep every stage busy: one per stage thread."""
+        return sum(executor.max_workers for _, _, executor in self.stages)
+
+    async def run(self, value: Any, stats: Dict[str, Any]) -> Any:
+        """Run ``value`` through all stages and return the last stage's result."""
+        for name, fn, executor in self.stages:
+            handed_over = time.perf_counter()
+
+            def call(value=value, fn=fn, name=name, handed_over=handed_over):
+                self._record_wait(name, stats, time.perf_counter() - handed_over)
+                return fn(value, stats)
+
+            value = await executor.run(call)
+        return value
+
+    def _record_wait(self, name: str, stats: Dict[str, Any], waited: float):
+        stats['wait_seconds'] = stats.get('wait_seconds', 0.0) + waited
+        with self._lock:
+            wait = self._waits[name]
+            wait["batches"] += 1
+            wait["total"] += waited
+            wait["max"] = max(wait["max"], waited)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return each stage's thread count and how long batches waited for it, in milliseconds."""
+        with self._lock:
+            return {
+                name: {
+                    "workers": executor.max_workers,
+                    "batches": self._waits[name]["batches"],
+                    "avg_wait_ms": round(self._waits[name]["total"] / (self._waits[name]["batches"] or 1) * 1000, 3),
+                    "max_wait_ms": round(self._waits[name]["max"] * 1000, 3),
+                }
+                for name, _, executor in self.stages
+            }
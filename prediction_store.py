@@ -0,0 +1,281 @@
+"""
+Persistent SQLite store of model logits for the BERT text classification API.
+Keeps predictions across restarts and redeploys, shared by all workers on a node.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from cache import model_fingerprint, text_hash
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    text_hash TEXT NOT NULL,
+    model_checksum TEXT NOT NULL,
+    logits BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (text_hash, model_checksum)
+) WITHOUT ROWID
+"""
+
+# Compaction selects and deletes entries by age
+INDEX = "CREATE INDEX IF NOT EXISTS predictions_created_at ON predictions (created_at)"
+
+# SQLite limits the number of host parameters per statement
+LOOKUP_CHUNK = 500
+
+# How long lookups and writes wait for a lock held by another connection; compaction waits longer
+REQUEST_BUSY_TIMEOUT_MS = 100
+COMPACT_BUSY_TIMEOUT_MS = 30000
+
+
+class PredictionStore:
+    """
+    SQLite-backed map from (text hash, model checksum) to logits.
+
+    The database runs in WAL mode, so any number of worker processes can
+    read concurrently while one of them writes. Each thread opens its own
+    connection on first use and connections are never reused across a fork,
+    so a store created before gunicorn forks its workers is safe to use in them.
+
+    Compaction (dropping entries older than ``max_age_seconds`` and the
+    oldest entries beyond ``max_entries``, then returning free pages to the
+    file system) runs on a background thread started with ``start_compaction``.
+    Entries of other models age out like any other; with ``purge_other_models``
+    they are dropped at once, which only suits a node serving a single model,
+    since during a rolling deploy the old and new workers would purge each other.
+
+    The store is best-effort: a lookup or write that fails, e.g. because
+    another worker holds the write lock longer than a short busy timeout,
+    is logged and counted as misses or write errors instead of failing the
+    predictions.
+    """
+
+    def __init__(self, path: str, checksum: str, lowercase: bool = False,
+                 max_entries: int = 1_000_000, max_age_seconds: float = 30 * 86400,
+                 compact_interval: float = 600, purge_other_models: bool = False):
+        self.path = path
+        self.checksum = checksum
+        self.lowercase = lowercase
+        self.max_entries = max_entries
+        self.max_age = max_age_seconds
+        self.compact_interval = compact_interval
+        self.purge_other_models = purge_other_models
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.read_errors = 0
+        self.write_errors = 0
+        self.compactions = 0
+        self.last_compaction: Optional[Dict[str, Any]] = None
+
+        # Create the schema with a short-lived connection that is not inherited by forked workers
+        connection = self._connect(COMPACT_BUSY_TIMEOUT_MS)
+        try:
+            connection.execute(SCHEMA)
+            connection.execute(INDEX)
+        finally:
+            connection.close()
+
+    def _connect(self, busy_timeout_ms: int = REQUEST_BUSY_TIMEOUT_MS) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=busy_timeout_ms / 1000, isolation_level=None,
+                                     check_same_thread=False)
+        # auto_vacuum only takes effect on a new database, before the first table exists
+        connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get_many(self, texts: List[str]) -> Dict[str, torch.Tensor]:
+        """Return the stored logits for whichever of the texts are present; on a database error, none."""
+        hashes = {text_hash(text, self.lowercase): text for text in texts}
+        found: Dict[str, torch.Tensor] = {}
+        keys = list(hashes)
+
+        try:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                rows = self._connection.execute(
+                    f"SELECT text_hash, logits FROM predictions "
+                    f"WHERE model_checksum = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [self.checksum, *chunk]
+                ).fetchall()
+                for key, blob in rows:
+                    found[hashes[key]] = torch.frombuffer(bytearray(blob), dtype=torch.float32)
+        except sqlite3.Error as e:
+            logger.warning(f"Prediction store lookup failed: {str(e)}")
+            found = {}
+            with self._lock:
+                self.read_errors += 1
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, logits_by_text: Dict[str, torch.Tensor]):
+        """Store logits for several texts in one transaction; on a database error, skip them."""
+        if not logits_by_text:
+            return
+        now = time.time()
+        rows = [
+            (text_hash(text, self.lowercase), self.checksum,
+             logits.detach().cpu().to(torch.float32).numpy().tobytes(), now)
+            for text, logits in logits_by_text.items()
+        ]
+        try:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO predictions (text_hash, model_checksum, logits, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Prediction store write of {len(rows)} entries skipped: {str(e)}")
+            with self._lock:
+                self.write_errors += len(rows)
+            return
+        with self._lock:
+            self.writes += len(rows)
+
+    def compact(self) -> Dict[str, Any]:
+        """Drop stale and excess entries, then release free pages and truncate the WAL."""
+        connection = self._connection
+        # Unlike lookups and writes, compaction can afford to wait for the write lock
+        connection.execute(f"PRAGMA busy_timeout = {COMPACT_BUSY_TIMEOUT_MS}")
+        try:
+            return self._compact(connection)
+        finally:
+            connection.execute(f"PRAGMA busy_timeout = {REQUEST_BUSY_TIMEOUT_MS}")
+
+    def _compact(self, connection: sqlite3.Connection) -> Dict[str, Any]:
+        started = time.perf_counter()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            other_models = 0
+            if self.purge_other_models:
+                other_models = connection.execute(
+                    "DELETE FROM predictions WHERE model_checksum != ?", [self.checksum]
+                ).rowcount
+            expired = 0
+            if self.max_age > 0:
+                expired = connection.execute(
+                    "DELETE FROM predictions WHERE created_at < ?", [time.time() - self.max_age]
+                ).rowcount
+            trimmed = connection.execute(
+                "DELETE FROM predictions WHERE (text_hash, model_checksum) IN ("
+                "SELECT text_hash, model_checksum FROM predictions ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                [self.max_entries]
+            ).rowcount
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        connection.execute("PRAGMA incremental_vacuum")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        entries = connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+        report = {
+            "entries": entries,
+            "removed_other_models": other_models,
+            "removed_expired": expired,
+            "removed_excess": trimmed,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        with self._lock:
+            self.compactions += 1
+            self.last_compaction = report
+        logger.info(f"Prediction store compacted: {report}")
+        return report
+
+    def start_compaction(self):
+        """Start compacting periodically on a daemon thread (call after forking)."""
+        if self.compact_interval <= 0 or (self._compactor and self._compactor.is_alive()):
+            return
+        self._stop.clear()
+        self._compactor = threading.Thread(target=self._compact_loop, name="store-compaction", daemon=True)
+        self._compactor.start()
+
+    def stop_compaction(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5)
+            self._compactor = None
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                logger.warning(f"Prediction store compaction failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return lookup counters; the entry count is refreshed by each compaction."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "read_errors": self.read_errors,
+                "write_errors": self.write_errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "compactions": self.compactions,
+                "last_compaction": self.last_compaction,
+            }
+
+
+def create_prediction_store(model_path: str, tokenizer, *fingerprint_parts: Any) -> Optional[PredictionStore]:
+    """
+    Open the persistent store configured by FITMIND_STORE_PATH.
+
+    Returns None when FITMIND_STORE_PATH is not set, which disables the store.
+    """
+    path = os.getenv("FITMIND_STORE_PATH")
+    if not path:
+        return None
+
+    store = PredictionStore(
+        path,
+        model_fingerprint(model_path, *fingerprint_parts),
+        lowercase=bool(getattr(tokenizer, "do_lower_case", False)),
+        max_entries=int(os.getenv("FITMIND_STORE_MAX_ENTRIES", 1_000_000)),
+        max_age_seconds=float(os.getenv("FITMIND_STORE_MAX_AGE_DAYS", 30)) * 86400,
+        compact_interval=float(os.getenv("FITMIND_STORE_COMPACT_INTERVAL", 600)),
+        purge_other_models=os.getenv("FITMIND_STORE_PURGE_OTHER_MODELS", "0") == "1"
+    )
+    logger.info(f"Prediction store opened at {path}")
+    return store
@@ -0,0 +1,58 @@
+"""
+Process memory reporting for the BERT text classification API.
+Used to check how much memory each server worker really owns when model weights are shared.
+"""
+
+import os
+import resource
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SMAPS_ROLLUP = "/proc/{pid}/smaps_rollup"
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, Optional[float]]:
+    """
+    Return the memory use of a process (default: the current one) in megabytes.
+
+    ``rss`` counts every resident page, including pages shared with other
+    workers. ``pss`` splits shared pages evenly between the processes that
+    map them and ``uss`` counts only pages private to this process, so with
+    copy-on-write sharing working, ``uss`` stays far below ``rss``.
+    PSS/USS/shared are only available on Linux, as is reporting on other
+    processes.
+    """
+    usage = {"pid": pid or os.getpid(), "rss_mb": None, "pss_mb": None, "uss_mb": None, "shared_mb": None}
+
+    try:
+        fields = {}
+        with open(SMAPS_ROLLUP.format(pid=pid or "self")) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        if pid is not None:
+            return usage
+        # Not Linux: fall back to peak RSS (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage["rss_mb"] = round(peak / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+        return usage
+
+    usage["rss_mb"] = round(fields.get("Rss", 0) / 1024, 1)
+    usage["pss_mb"] = round(fields.get("Pss", 0) / 1024, 1)
+    usage["uss_mb"] = round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1)
+    usage["shared_mb"] = round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1)
+    return usage
+
+
+def process_tree(pid: int) -> List[int]:
+    """Return a process and all of its descendants, e.g. a gunicorn master and its workers (Linux only)."""
+    pids = [pid]
+    for parent in pids:
+        for children in Path(f"/proc/{parent}/task").glob("*/children"):
+            try:
+                pids.extend(int(child) for child in children.read_text().split())
+            except OSError:
+                continue
+    return pids
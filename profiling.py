@@ -0,0 +1,223 @@
+"""
+On-demand profiling for the BERT text classification API.
+
+A capture runs ``torch.profiler`` around the inference of the next N texts
+(or until T seconds have passed) and samples the Python stacks of all
+threads meanwhile. It writes to its own directory:
+
+- ``trace-<n>.json``: Chrome trace of each profiled batch (open in chrome://tracing or Perfetto)
+- ``top_ops.txt``: operators ranked by self CPU time, summed over all batches
+- ``python_stacks.txt``: sampled Python stacks in collapsed format (for flamegraph.pl or speedscope)
+
+When no capture is running, inference only checks one boolean.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TOP_OPS = 30
+
+
+class ProfileCapture:
+    """One profiling run, limited to ``max_requests`` texts or ``max_seconds``, whichever comes first."""
+
+    def __init__(self, directory: Path, max_requests: int, max_seconds: float,
+                 sample_interval_ms: float = 5.0):
+        self.directory = directory
+        self.max_requests = max_requests
+        self.max_seconds = max_seconds
+        self.sample_interval = sample_interval_ms / 1000.0
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + max_seconds
+        self.requests = 0
+        self.batches = 0
+        self.samples = 0
+        self.finished_at: Optional[float] = None
+        self.files: List[str] = []
+        self._ops: Dict[str, Dict[str, float]] = {}
+        self._stacks: Counter = Counter()
+        self._in_flight = 0
+        self._profiling = False
+        self._lock = threading.Condition()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    @property
+    def active(self) -> bool:
+        return not self._done.is_set()
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sampler.start()
+        logger.info(
+            f"Profiling the next {self.max_requests} texts or {self.max_seconds:g}s into {self.directory}"
+        )
+
+    def stop(self):
+        self._done.set()
+
+    @contextmanager
+    def profile(self, num_requests: int) -> Iterator[None]:
+        """
+        Run the enclosed inference under torch.profiler, unless the capture is already complete.
+
+        Only one batch holds the profiler at a time, since torch.profiler
+        sessions must not overlap; batches that run meanwhile on other
+        inference threads are not profiled.
+        """
+        from torch.profiler import ProfilerActivity, profile
+
+        with self._lock:
+            if not self.active or self.requests >= self.max_requests or self._profiling:
+                profiled = False
+            else:
+                profiled = True
+                self.requests += num_requests
+                self.batches += 1
+                batch_number = self.batches
+                self._in_flight += 1
+                self._profiling = True
+
+        if not profiled:
+            yield
+            return
+
+        try:
+            with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+                yield
+            self._record_batch(prof, batch_number)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._profiling = False
+                self._lock.notify_all()
+                if self.requests >= self.max_requests:
+                    self._done.set()
+
+    def _record_batch(self, prof, batch_number: int):
+        path = self.directory / f"trace-{batch_number}.json"
+        prof.export_chrome_trace(str(path))
+
+        with self._lock:
+            self.files.append(path.name)
+            for event in prof.key_averages():
+                op = self._ops.setdefault(event.key, {"count": 0, "self_cpu_us": 0.0, "cpu_us": 0.0})
+                op["count"] += event.count
+                op["self_cpu_us"] += event.self_cpu_time_total
+                op["cpu_us"] += event.cpu_time_total
+
+    def _run(self):
+        """Sample Python stacks until the capture completes, then write the summaries."""
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        while not self._done.wait(self.sample_interval):
+            if time.monotonic() >= self.deadline:
+                break
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+        self._done.set()
+        with self._lock:
+            # Let profiled batches that are still running record their traces
+            self._lock.wait_for(lambda: self._in_flight == 0, timeout=30)
+            self.finished_at = time.time()
+            self._write_summaries()
+        logger.info(f"Profile written to {self.directory}: {self.status()}")
+
+    def _write_summaries(self):
+        ranked = sorted(self._ops.items(), key=lambda item: item[1]["self_cpu_us"], reverse=True)
+        total = sum(op["self_cpu_us"] for op in self._ops.values()) or 1.0
+        lines = [
+            f"{self.requests} texts in {self.batches} batches, {self.samples} Python stack samples",
+            "",
+            f"{'Operator':<48} {'Calls':>8} {'Self CPU ms':>12} {'Self %':>7} {'CPU ms':>10}",
+        ]
+        for name, op in ranked[:TOP_OPS]:
+            lines.append(
+                f"{name[:48]:<48} {op['count']:>8} {op['self_cpu_us'] / 1000:>12.2f} "
+                f"{op['self_cpu_us'] / total * 100:>6.1f}% {op['cpu_us'] / 1000:>10.2f}"
+            )
+        (self.directory / "top_ops.txt").write_text("\n".join(lines) + "\n")
+
+        with open(self.directory / "python_stacks.txt", "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # Written last, so that it lists every file of the capture
+        self.files.extend(["top_ops.txt", "python_stacks.txt", "capture.json"])
+        (self.directory / "capture.json").write_text(json.dumps(self.status(), indent=2))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "directory": str(self.directory),
+            "max_requests": self.max_requests,
+            "max_seconds": self.max_seconds,
+            "requests": self.requests,
+            "batches": self.batches,
+            "samples": self.samples,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "files": sorted(self.files),
+        }
+
+
+class Profiler:
+    """Starts captures on demand and hands the active one to the inference code."""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = Path(output_dir)
+        self.capture: Optional[ProfileCapture] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        capture = self.capture
+        return capture is not None and capture.active
+
+    def start(self, max_requests: int, max_seconds: float) -> ProfileCapture:
+        """Start a capture; raises RuntimeError if one is already running."""
+        with self._lock:
+            if self.active:
+                raise RuntimeError("A profile capture is already running")
+            name = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+            self.capture = ProfileCapture(self.output_dir / name, max_requests, max_seconds)
+            self.capture.start()
+            return self.capture
+
+    def stop(self):
+        """End the running capture early; its results are still written."""
+        if self.capture is not None:
+            self.capture.stop()
+
+    @contextmanager
+    def profile(self, num_requests: int) -> Iterator[None]:
+        """Profile the enclosed inference if a capture is running; otherwise do nothing."""
+        capture = self.capture
+        if capture is None or not capture.active:
+            yield
+            return
+        with capture.profile(num_requests):
+            yield
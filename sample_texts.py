@@ -0,0 +1,44 @@
+"""
+Sample texts and text-file reading shared by the command-line tools.
+
+Kept free of torch and transformers so that tools like ``loadtest.py``
+can use it without loading the model stack.
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional
+
+# Used when no texts file is given
+SAMPLE_TEXTS = [
+    "This movie is absolutely amazing! I loved every minute of it.",
+    "This product is terrible and I hate it.",
+    "The weather today is cloudy.",
+    "I'm feeling great today!",
+    "This is the worst experience I've ever had.",
+    "It's okay, nothing special.",
+    "This is fine.",
+    "Had a long day at work but dinner with friends cheered me up.",
+    "I couldn't sleep again last night and everything feels heavy.",
+    "Finally finished my first 10k run, so proud of myself!",
+    "I keep worrying about the exam next week.",
+    "Spent the afternoon reading in the park. Calm and quiet.",
+]
+
+
+def read_texts(path: Optional[str]) -> List[str]:
+    """Read texts from a JSONL file (using its "text" field) or a plain file with one text per line."""
+    if path is None:
+        return SAMPLE_TEXTS
+
+    texts = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            record = json.loads(line)
+            line = record.get("text") or record.get("body") or ""
+        if line:
+            texts.append(line)
+    return texts
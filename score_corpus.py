@@ -0,0 +1,190 @@
+"""
+Offline batch scorer for JSONL corpora, without the HTTP server.
+
+Each worker process loads the model with the same logic as the API
+(``app.load_model_and_tokenizer``) and scores batches of texts. Inputs are
+sorted by length within each chunk so batches pad as little as possible.
+Results are appended to the output file one batch at a time; the output
+doubles as the checkpoint, so an interrupted run resumes by skipping the
+input lines already present in it. The reported docs/sec only counts the
+results that arrive after every worker has loaded the model.
+
+Usage:
+    python score_corpus.py corpus.jsonl scores.jsonl --workers 4 --text-field body --id-field request_id
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Set in each worker process by init_worker
+_app = None
+
+
+def init_worker(threads_per_worker: int, loaded):
+    """Load the model once per worker process, then count the worker in ``loaded``."""
+    global _app
+
+    if threads_per_worker > 0:
+        os.environ["FITMIND_TORCH_THREADS"] = str(threads_per_worker)
+    # Offline scoring reads each text once; the in-memory cache would only use memory
+    os.environ.setdefault("FITMIND_CACHE_SIZE", "0")
+
+    import app
+    app.load_model_and_tokenizer()
+    _app = app
+    with loaded.get_lock():
+        loaded.value += 1
+
+
+def score_batch(batch: List[Tuple[int, Optional[str], str]]) -> List[Dict]:
+    """Score a batch of (line number, id, text) tuples in one forward pass."""
+    predictions = _app.predict_batch([text for _, _, text in batch])
+    return [
+        {"line": line_number, "id": item_id, **prediction.model_dump()}
+        for (line_number, item_id, _), prediction in zip(batch, predictions)
+    ]
+
+
+def completed_lines(output: Path) -> Set[int]:
+    """
+    Return the input line numbers already scored in an existing output file.
+
+    A partially written last line (from an interrupted run) is cut off so
+    appending continues from a clean line boundary.
+    """
+    done: Set[int] = set()
+    if not output.exists():
+        return done
+
+    with open(output, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+        for line in data[:end].splitlines():
+            if line.strip():
+                done.add(json.loads(line)["line"])
+    return done
+
+
+def read_chunks(path: Path, text_field: str, id_field: str, chunk_size: int,
+                skip: Set[int]) -> Iterator[Tuple[List[Tuple[int, Optional[str], str]], List[Dict]]]:
+    """
+    Yield chunks of (line number, id, text) items still to be scored.
+
+    Lines that cannot be scored are yielded alongside as error records.
+    """
+    items, errors = [], []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line_number in skip or not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                text = record.get(text_field)
+                item_id = record.get(id_field)
+            except (json.JSONDecodeError, AttributeError) as e:
+                errors.append({"line": line_number, "id": None, "error": f"Invalid JSON: {str(e)}"})
+                continue
+            if not isinstance(text, str) or not text.strip():
+                errors.append({"line": line_number, "id": item_id, "error": f"Missing '{text_field}' field"})
+                continue
+
+            items.append((line_number, None if item_id is None else str(item_id), text))
+            if len(items) >= chunk_size:
+                yield items, errors
+                items, errors = [], []
+
+    if items or errors:
+        yield items, errors
+
+
+def length_sorted_batches(items: List[Tuple[int, Optional[str], str]], batch_size: int) -> List[List]:
+    """Group items of similar length into batches, longest first so the slowest work starts early."""
+    ordered = sorted(items, key=lambda item: len(item[2]), reverse=True)
+    return [ordered[start:start + batch_size] for start in range(0, len(ordered), batch_size)]
+
+
+def write_records(f, records: List[Dict]):
+    """Append records and flush them to disk, so they count as checkpointed."""
+    f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a JSONL corpus with the classification model")
+    parser.add_argument("input", type=Path, help="JSONL file with one object per line")
+    parser.add_argument("output", type=Path, help="JSONL file to append results to (also the resume checkpoint)")
+    parser.add_argument("--text-field", default="text", help="Field holding the text to score (default: text)")
+    parser.add_argument("--id-field", default="id", help="Field echoed back as the result id (default: id)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes, each with its own copy of the model")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Torch threads per worker (default: the cores divided among the workers; "
+                             "0 leaves it to torch, which starts one per core in every worker)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per forward pass")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="Input lines read, length-sorted and scored at a time")
+    args = parser.parse_args()
+    if args.threads_per_worker is None:
+        args.threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+
+    done = completed_lines(args.output)
+    if done:
+        print(f"Resuming: {len(done)} lines already scored in {args.output}", file=sys.stderr)
+
+    started = time.perf_counter()
+    # Throughput is measured once every worker has loaded the model, so no load time is counted in it
+    loaded = multiprocessing.Value("i", 0)
+    first_result = all_loaded = None
+    scored = failed = 0
+    scored_before_rate = 0
+
+    with open(args.output, "a", encoding="utf-8") as out, \
+            multiprocessing.Pool(args.workers, initializer=init_worker,
+                                 initargs=(args.threads_per_worker, loaded)) as pool:
+        for items, errors in read_chunks(args.input, args.text_field, args.id_field, args.chunk_size, done):
+            if errors:
+                write_records(out, errors)
+                failed += len(errors)
+
+            for records in pool.imap_unordered(score_batch, length_sorted_batches(items, args.batch_size)):
+                write_records(out, records)
+                scored += len(records)
+                if first_result is None:
+                    first_result = time.perf_counter() - started
+                if all_loaded is None:
+                    if loaded.value >= args.workers:
+                        all_loaded = time.perf_counter() - started
+                        scored_before_rate = scored
+                    print(f"\rScored {scored} docs (workers still loading)", end="", file=sys.stderr)
+                    continue
+                rate = (scored - scored_before_rate) / (time.perf_counter() - started - all_loaded)
+                print(f"\rScored {scored} docs ({rate:.1f} docs/sec)", end="", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    scoring = elapsed - all_loaded if all_loaded is not None else 0.0
+    print(file=sys.stderr)
+    print(json.dumps({
+        "scored": scored,
+        "failed": failed,
+        "skipped_already_done": len(done),
+        "workers": args.workers,
+        "threads_per_worker": args.threads_per_worker,
+        "elapsed_seconds": round(elapsed, 2),
+        "first_result_seconds": round(first_result, 2) if first_result is not None else None,
+        "workers_loaded_seconds": round(all_loaded, 2) if all_loaded is not None else None,
+        "scoring_seconds": round(scoring, 2),
+        # None when the run ended before every worker had loaded the model
+        "docs_per_second": round((scored - scored_before_rate) / scoring, 2) if scored > scored_before_rate else None,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Newline-delimited JSON (NDJSON) streaming helpers for bulk scoring.
+Requests are read line by line and results are written as they are produced, so memory stays flat.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class LineTooLongError(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Split a byte stream into lines, yielding (line number, line) pairs.
+
+    Blank lines are skipped but still counted. Raises LineTooLongError if a
+    line exceeds ``max_line_bytes``, so one malformed record cannot make the
+    server buffer an unbounded amount of data.
+    """
+    buffer = b""
+    line_number = 0
+
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            end = buffer.find(b"\n")
+            if end < 0:
+                break
+            line, buffer = buffer[:end], buffer[end + 1:]
+            line_number += 1
+            if len(line) > max_line_bytes:
+                raise LineTooLongError(f"Line {line_number} exceeds {max_line_bytes} bytes")
+            if line.strip():
+                yield line_number, line
+        if len(buffer) > max_line_bytes:
+            raise LineTooLongError(f"Line {line_number + 1} exceeds {max_line_bytes} bytes")
+
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+
+def ndjson_line(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Stream NDJSON while the body iterator is still reading the request body.
+
+    Starlette's StreamingResponse may listen for client disconnects by
+    calling ``receive()`` concurrently, which would consume request body
+    chunks meant for the body iterator. Here only the body iterator reads the
+    request; a disconnect surfaces to it as ClientDisconnect. Because each
+    ``send`` waits for the transport to drain, a slow client throttles how
+    fast the request is read and scored (backpressure).
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        try:
+            async for chunk in self.body_iterator:
+                if not isinstance(chunk, (bytes, memoryview)):
+                    chunk = chunk.encode(self.charset)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        except (ClientDisconnect, OSError):
+            # The client went away; nothing left to send to
+            return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
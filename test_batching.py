@@ -0,0 +1,197 @@
+"""
+Unit tests for the micro-batcher, with a fake ``process_batch`` in place of the model.
+
+Run with ``python -m pytest test_batching.py``.
+"""
+
+import asyncio
+
+import pytest
+
+from batching import MicroBatcher, QueueFullError
+
+
+class FakeModel:
+    """Record each batch it is given and return every item doubled; with ``hold``, block until released."""
+
+    def __init__(self, hold: bool = False):
+        self.batches = []
+        self.started = asyncio.Event()
+        self.released = asyncio.Event()
+        if not hold:
+            self.released.set()
+
+    async def process_batch(self, items):
+        self.batches.append(list(items))
+        self.started.set()
+        await self.released.wait()
+        return [item * 2 if isinstance(item, int) else item for item in items]
+
+
+async def with_batcher(model, test, **kwargs):
+    batcher = MicroBatcher(model.process_batch, **kwargs)
+    await batcher.start()
+    try:
+        return await test(batcher)
+    finally:
+        await batcher.stop()
+
+
+def test_batches_are_cut_at_max_batch_size():
+    model = FakeModel()
+
+    async def test(batcher):
+        return await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+
+    results = asyncio.run(with_batcher(model, test, max_batch_size=3, max_wait_ms=50))
+    assert results == [i * 2 for i in range(7)]
+    assert model.batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_batches_stay_within_the_token_budget():
+    model = FakeModel()
+
+    async def test(batcher):
+        return await asyncio.gather(*(batcher.submit(4) for _ in range(5)))
+
+    asyncio.run(with_batcher(model, test, max_batch_size=16, max_wait_ms=50,
+                             cost=lambda item: item, max_batch_tokens=8))
+    assert model.batches == [[4, 4], [4, 4], [4]]
+
+
+def test_items_are_grouped_by_cost_cheapest_first():
+    model = FakeModel()
+
+    async def test(batcher):
+        return await asyncio.gather(*(batcher.submit(item) for item in [40, 5, 35, 6]))
+
+    results = asyncio.run(with_batcher(model, test, max_batch_size=16, max_wait_ms=10, max_defer_ms=1000,
+                                       cost=lambda item: item))
+    assert results == [80, 10, 70, 12]
+    assert model.batches == [[5, 6], [35, 40]]
+
+
+def test_lanes_take_turns_by_weight():
+    model = FakeModel()
+
+    async def test(batcher):
+        submits = [batcher.submit(("interactive", i), "interactive") for i in range(8)]
+        submits += [batcher.submit(("bulk", i), "bulk") for i in range(8)]
+        await asyncio.gather(*submits)
+        return batcher.lane_stats()
+
+    stats = asyncio.run(with_batcher(model, test, max_batch_size=1, max_wait_ms=0,
+                                     lanes={"interactive": 3, "bulk": 1}))
+    lanes = [batch[0][0] for batch in model.batches]
+    assert all(len({item[0] for item in batch}) == 1 for batch in model.batches)
+    # While both lanes are backlogged, interactive gets three batches for each bulk one
+    assert lanes[:8].count("interactive") == 6
+    assert lanes[:8].count("bulk") == 2
+    assert stats["interactive"]["batches"] == stats["bulk"]["batches"] == 8
+
+
+def test_cancelled_caller_is_dropped_before_it_runs():
+    model = FakeModel(hold=True)
+
+    async def test(batcher):
+        first = asyncio.create_task(batcher.submit(1))
+        await model.started.wait()
+        dropped = asyncio.create_task(batcher.submit(2))
+        kept = asyncio.create_task(batcher.submit(3))
+        await asyncio.sleep(0)
+        assert batcher.queue_depth == 2
+
+        dropped.cancel()
+        model.released.set()
+        results = await asyncio.gather(first, kept)
+        assert dropped.cancelled()
+        return results
+
+    results = asyncio.run(with_batcher(model, test, max_batch_size=4, max_wait_ms=0))
+    assert results == [2, 6]
+    assert model.batches == [[1], [3]]
+
+
+def test_lane_limit_rejects_or_waits():
+    model = FakeModel(hold=True)
+
+    async def test(batcher):
+        running = [asyncio.create_task(batcher.submit(i, "bulk")) for i in range(2)]
+        await model.started.wait()
+        with pytest.raises(QueueFullError):
+            await batcher.submit(2, "bulk")
+        waiting = asyncio.create_task(batcher.submit(3, "bulk", wait=True))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        assert batcher.lane_stats()["bulk"]["in_flight"] == 2
+
+        # Other lanes are not held back by the bulk limit
+        interactive = asyncio.create_task(batcher.submit(4, "interactive"))
+        await asyncio.sleep(0)
+        assert batcher.lane_depths()["interactive"] == 1
+
+        model.released.set()
+        return await asyncio.gather(*running, waiting, interactive)
+
+    results = asyncio.run(with_batcher(model, test, max_batch_size=1, max_wait_ms=0,
+                                       lanes={"interactive": 8, "bulk": 1}, lane_limits={"bulk": 2}))
+    assert results == [0, 2, 6, 8]
+
+
+def test_stop_fails_callers_waiting_for_lane_room():
+    model = FakeModel(hold=True)
+
+    async def test():
+        batcher = MicroBatcher(model.process_batch, max_batch_size=1, max_wait_ms=0,
+                               lanes={"interactive": 8, "bulk": 1}, lane_limits={"bulk": 1})
+        await batcher.start()
+        running = asyncio.create_task(batcher.submit(1, "bulk"))
+        await model.started.wait()
+        waiting = asyncio.create_task(batcher.submit(2, "bulk", wait=True))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        await batcher.stop()
+        results = await asyncio.wait_for(asyncio.gather(running, waiting, return_exceptions=True), timeout=1)
+        assert all(isinstance(result, (RuntimeError, asyncio.CancelledError)) for result in results)
+        assert str(results[1]) == "Batcher stopped"
+
+    asyncio.run(test())
+
+
+def test_queue_depth_limit_rejects_new_items():
+    model = FakeModel(hold=True)
+
+    async def test(batcher):
+        first = asyncio.create_task(batcher.submit(1))
+        await model.started.wait()
+        queued = [asyncio.create_task(batcher.submit(i)) for i in (2, 3)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await batcher.submit(4)
+
+        # A caller that went away frees its place in the queue
+        queued[0].cancel()
+        await asyncio.sleep(0)
+        replacement = asyncio.create_task(batcher.submit(5))
+        await asyncio.sleep(0)
+        assert batcher.queue_depth == 2
+
+        model.released.set()
+        return await asyncio.gather(first, queued[1], replacement)
+
+    results = asyncio.run(with_batcher(model, test, max_batch_size=1, max_wait_ms=0, max_queue_depth=2))
+    assert results == [2, 6, 10]
+
+
+@pytest.mark.parametrize("cost", [None, lambda item: 8])
+def test_items_of_different_groups_never_share_a_batch(cost):
+    model = FakeModel()
+
+    async def test(batcher):
+        return await asyncio.gather(*(batcher.submit(item) for item in [1, "a", 2, "b", 3]))
+
+    results = asyncio.run(with_batcher(model, test, max_batch_size=16, max_wait_ms=10, cost=cost,
+                                       group=lambda item: isinstance(item, str)))
+    assert results == [2, "a", 4, "b", 6]
+    assert model.batches == [[1, 2, 3], ["a", "b"]]
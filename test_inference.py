@@ -0,0 +1,82 @@
+"""
+Tests for the shared inference helpers that need the tokenizer but not the model.
+
+Run with ``python -m pytest test_inference.py``.
+"""
+
+import threading
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("transformers")
+
+from backends import load_tokenizer
+from inference import LENGTH_BUCKETS, ThreadLocalTokenizer, bucket_length, encode_texts, estimate_tokens
+
+MODEL_PATH = str(Path(__file__).resolve().parent)
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return ThreadLocalTokenizer(load_tokenizer(MODEL_PATH))
+
+
+def test_each_thread_gets_its_own_tokenizer(tokenizer):
+    copies = []
+    thread = threading.Thread(target=lambda: copies.append(tokenizer.get()))
+    thread.start()
+    thread.join()
+
+    assert copies[0] is not tokenizer.get()
+    assert tokenizer.get() is tokenizer.get()
+    assert tokenizer.pad_token_id == copies[0].pad_token_id
+
+
+def test_predict_and_window_encodes_run_concurrently(tokenizer):
+    texts = ["I feel " + "calm " * n for n in range(1, 120)] * 4
+    expected = encode_texts(tokenizer, texts, max_length=512)["attention_mask"].sum(dim=1).tolist()
+    document = "A long journal entry about a long day. " * 400
+    errors = []
+
+    def predict_batches():
+        # /predict batches, tokenized on the pipeline's prepare thread
+        for _ in range(200):
+            try:
+                lengths = encode_texts(tokenizer, texts, max_length=512)["attention_mask"].sum(dim=1).tolist()
+                if lengths != expected:
+                    errors.append("truncated at another thread's settings")
+            except Exception as e:
+                errors.append(repr(e))
+
+    def long_text_windows():
+        # /predict/long windows, tokenized on the inference thread
+        for _ in range(200):
+            try:
+                tokenizer(document, add_special_tokens=True, max_length=32, truncation=True, stride=8,
+                          return_overflowing_tokens=True, padding=False)
+            except Exception as e:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=predict_batches), threading.Thread(target=long_text_windows)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+@pytest.mark.parametrize("text", [
+    "Feeling calm after a long walk by the river. " * 6,
+    "今日はとても疲れたけど、友達と話して少し元気になった。" * 2,
+    "오늘은 정말 힘든 하루였지만 산책을 하고 나니 기분이 나아졌다. " * 2,
+    "😀 🎉 😢 🔥 ❤️ " * 8,
+    "Café, naïveté, über-müde!!! ¿Qué tal? " * 10,
+    "Привет, как дела? Мне грустно сегодня. " * 3,
+    "a.b.c.d 1,2,3,4,5 !!!???..." * 4,
+])
+def test_estimated_tokens_cover_the_padded_length(tokenizer, text):
+    # Batches are admitted by estimated tokens, so an estimate below the real padded length overruns the budget
+    tokens = int(encode_texts(tokenizer, [text], max_length=512, buckets=None)["attention_mask"].sum())
+    assert estimate_tokens(text, 512, LENGTH_BUCKETS) >= bucket_length(tokens, LENGTH_BUCKETS)
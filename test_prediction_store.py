@@ -0,0 +1,126 @@
+"""
+Tests for the persistent prediction store and its compaction.
+
+Run with ``python -m pytest test_prediction_store.py``.
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import prediction_store
+from cache import PredictionCache
+from inference import lookup_logits, remember_logits
+from prediction_store import PredictionStore
+
+TEXTS = ["I feel great", "Rough day at work", "Slept well"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Time as seen by the store, moved forward by assigning to ``clock.now``."""
+
+    class Clock:
+        now = time.time()
+
+    monkeypatch.setattr(prediction_store.time, "time", lambda: Clock.now)
+    return Clock
+
+
+def open_store(tmp_path, checksum, **kwargs):
+    return PredictionStore(str(tmp_path / "predictions.db"), checksum, compact_interval=0, **kwargs)
+
+
+def put(store, texts, value=1.0):
+    store.put_many({text: torch.full((3,), value) for text in texts})
+
+
+def test_expired_entries_are_dropped(tmp_path, clock):
+    store = open_store(tmp_path, "model-a", max_age_seconds=60)
+    put(store, TEXTS[:2])
+    clock.now += 120
+    put(store, TEXTS[2:])
+
+    report = store.compact()
+    assert report["removed_expired"] == 2
+    assert report["entries"] == 1
+    assert set(store.get_many(TEXTS)) == set(TEXTS[2:])
+
+
+def test_trimming_keeps_the_newest_entries_of_each_model(tmp_path, clock):
+    old = open_store(tmp_path, "model-a", max_entries=3)
+    put(old, TEXTS, 1.0)
+    clock.now += 10
+    new = open_store(tmp_path, "model-b", max_entries=3)
+    put(new, TEXTS, 2.0)
+
+    report = new.compact()
+    # Only the old model's entries are past the cap, even though the texts are the same
+    assert report["removed_excess"] == 3
+    assert report["entries"] == 3
+    assert old.get_many(TEXTS) == {}
+    found = new.get_many(TEXTS)
+    assert set(found) == set(TEXTS)
+    assert all(torch.equal(logits, torch.full((3,), 2.0)) for logits in found.values())
+
+
+def test_other_models_are_kept_unless_purged(tmp_path, clock):
+    old = open_store(tmp_path, "model-a")
+    put(old, TEXTS)
+    new = open_store(tmp_path, "model-b")
+    put(new, TEXTS[:1])
+
+    report = new.compact()
+    assert report["removed_other_models"] == 0
+    assert report["entries"] == 4
+
+    purging = open_store(tmp_path, "model-b", purge_other_models=True)
+    report = purging.compact()
+    assert report["removed_other_models"] == 3
+    assert report["entries"] == 1
+    assert old.get_many(TEXTS) == {}
+    assert set(purging.get_many(TEXTS)) == set(TEXTS[:1])
+
+
+def test_locked_store_skips_writes_without_stalling(tmp_path):
+    store = open_store(tmp_path, "model-a")
+    put(store, TEXTS[:1])
+    # Another worker holding the write lock, as compaction does
+    other = sqlite3.connect(str(tmp_path / "predictions.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.perf_counter()
+        put(store, TEXTS[1:])
+        assert time.perf_counter() - started < 5
+        assert store.stats()["write_errors"] == 2
+        # Readers are not blocked by the writer in WAL mode
+        assert set(store.get_many(TEXTS)) == set(TEXTS[:1])
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+
+
+def test_failing_store_still_returns_predictions(tmp_path, monkeypatch):
+    store = open_store(tmp_path, "model-a")
+    cache = PredictionCache("model-a")
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "_connect", locked)
+
+    found, missing = lookup_logits(TEXTS, cache, store)
+    assert found == {}
+    assert missing == TEXTS
+
+    computed = {text: torch.full((3,), 1.0) for text in missing}
+    remember_logits(computed, cache, store)
+    assert torch.equal(cache.get(TEXTS[0]), computed[TEXTS[0]])
+
+    stats = store.stats()
+    assert stats["misses"] == 3
+    assert stats["read_errors"] == 1
+    assert stats["write_errors"] == 3
@@ -0,0 +1,46 @@
+"""
+Tests for the profile capture, run without the model.
+
+Run with ``python -m pytest test_profiling.py``.
+"""
+
+import threading
+
+import pytest
+
+pytest.importorskip("torch")
+
+from profiling import ProfileCapture
+
+
+def test_only_one_batch_holds_the_profiler(tmp_path):
+    capture = ProfileCapture(tmp_path, max_requests=10, max_seconds=60)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def profiled_batch():
+        with capture.profile(1):
+            entered.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=profiled_batch)
+    thread.start()
+    try:
+        assert entered.wait(10)
+        # A batch on another thread runs while the first still holds the profiler
+        with capture.profile(1):
+            pass
+        assert capture.batches == 1
+        assert capture.requests == 1
+    finally:
+        release.set()
+        thread.join()
+
+    assert capture.files == ["trace-1.json"]
+    assert not list(tmp_path.glob("*.tmp"))
+
+    # Once the profiler is free, the next batch is profiled again
+    with capture.profile(1):
+        pass
+    assert capture.batches == 2
+    assert capture.files == ["trace-1.json", "trace-2.json"]
@@ -0,0 +1,85 @@
+"""
+Per-request stage timing for the BERT text classification API.
+Reported to callers as a Server-Timing header and, optionally, as one JSON log line per request.
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("fitmind.timing")
+
+# Stages in the order a request passes through them
+STAGES = ("queue", "tokenize", "forward", "postprocess", "serialize")
+
+
+def enable_timing_log():
+    """Write timing records as bare JSON lines to stderr, without the usual log prefix."""
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class RequestTiming:
+    """
+    Stage durations of a single request, from submission to serialized response.
+
+    ``queue`` is the time the request spent waiting: from submission until
+    its batch started running (for the batch to fill and for a free
+    inference thread), plus any wait between pipeline stages.
+    ``tokenize``, ``forward`` and ``postprocess`` are those of the whole
+    batch the request ran in, as every request in it waited for them.
+    ``tokens`` is None when the result came from the cache or store.
+    """
+
+    def __init__(self):
+        self.submitted = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.tokens: Optional[int] = None
+        self.batch_size: Optional[int] = None
+        self.cached = False
+
+    def record_batch(self, dispatched: float, stats: Dict[str, Any], text: str, batch_size: int):
+        """Fill in the stages of the batch this request ran in, from the stats collected by ``predict_batch``."""
+        self.durations["queue"] = dispatched - self.submitted + stats.get("wait_seconds", 0.0)
+        self.durations["tokenize"] = stats.get("tokenize_seconds", 0.0)
+        self.durations["forward"] = stats.get("forward_seconds", 0.0)
+        self.durations["postprocess"] = stats.get("postprocess_seconds", 0.0)
+        self.tokens = stats.get("text_tokens", {}).get(text)
+        self.cached = self.tokens is None
+        self.batch_size = batch_size
+
+    def record(self, stage: str, seconds: float):
+        self.durations[stage] = seconds
+
+    def total(self) -> float:
+        return time.perf_counter() - self.submitted
+
+    def server_timing(self) -> str:
+        """Format the stages as a Server-Timing header value, in milliseconds."""
+        metrics = [
+            f"{stage};dur={self.durations[stage] * 1000:.2f}"
+            for stage in STAGES if stage in self.durations
+        ]
+        metrics.append(f"total;dur={self.total() * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def log(self, endpoint: str, status: int, request_id: Optional[str] = None):
+        """Write the breakdown as one JSON line to the ``fitmind.timing`` logger."""
+        record = {
+            "event": "request_timing",
+            "endpoint": endpoint,
+            "status": status,
+            "request_id": request_id,
+            "total_ms": round(self.total() * 1000, 2),
+            **{f"{stage}_ms": round(self.durations[stage] * 1000, 2) for stage in STAGES if stage in self.durations},
+            "tokens": self.tokens,
+            "batch_size": self.batch_size,
+            "cached": self.cached,
+        }
+        logger.info(json.dumps(record))